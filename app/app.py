@@ -1,193 +1,739 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import (
+    FastAPI,
+    Body,
+    Depends,
+    Header,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    status,
+)
+from fastapi.responses import StreamingResponse
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import IntegrityError
-from typing import List, Optional
+from typing import Any, Dict, List, Literal, Optional
 from datetime import datetime, timezone, timedelta
+from pydantic import BaseModel, ValidationError
 from contextlib import asynccontextmanager
 
-from app.database import SessionLocal, engine
-from app.models import Base, Task, User
-from app.schemas import TaskCreate, TaskRead, UserCreate, UserRead
+from app.database import engine, get_db, get_pool_stats
+from app.models import Task, TaskDeletion, User, utcnow
+from app.schemas import (
+    BulkItemError,
+    BulkTaskResult,
+    ImportResult,
+    Principal,
+    RefreshRequest,
+    TaskChanges,
+    TaskBulkUpdate,
+    TaskCreate,
+    TaskRead,
+    UserCreate,
+    UserRead,
+)
 from app.auth import (
+    consume_refresh_token,
     create_access_token,
-    get_password_hash,
-    verify_password,
-    get_current_user,
+    create_refresh_token,
+    get_current_principal,
+    get_stream_principal,
+    oauth2_scheme,
+    revoke_refresh_token,
+    revoke_token,
+)
+from app.events import stream_task_events, task_event_message
+from app.rate_limit import check_auth_rate_limit
+from app.passwords import (
+    hash_password_async,
+    shutdown_hash_executor,
+    verify_password_async,
+)
+from app.pagination import (
+    MAX_PAGE_SIZE,
+    Ordering,
+    decode_cursor,
+    encode_cursor,
+    get_ordering,
+    get_page_size,
+    keyset_predicate,
+    order_by_clauses,
+)
+from app.filters import TaskFilters, filter_clauses, make_task_filters
+from app.search import search_filter, search_rank, search_terms
+from app.sync import (
+    SYNC_OVERLAP,
+    TASK_DELETION_RETENTION,
+    decode_sync_cursor,
+    encode_sync_cursor,
+)
+from app.task_views import derive_task_page
+from app.task_io import (
+    EXPORT_BATCH_SIZE,
+    EXPORT_COLUMNS,
+    EXPORT_MEDIA_TYPES,
+    IMPORT_CHUNK_SIZE,
+    MAX_IMPORT_ERRORS,
+    copy_tasks,
+    iter_csv_items,
+    iter_ndjson_items,
+    stream_export,
 )
 from app.cache import (
-    get_cached_tasks,
-    set_cached_tasks,
-    generate_cache_key,
+    FULL_SET_MAX_TASKS,
+    CachedPage,
+    RoundTripMiddleware,
+    describe_task_query,
+    get_derived_page,
+    get_or_build_user_tasks,
+    get_or_load_task_set,
+    set_derived_page,
     invalidate_user_cache,
+    write_through_tasks,
+    get_cache_stats,
+    init_redis,
+    close_redis,
 )
 
 
 @asynccontextmanager
 async def startup_event(app: FastAPI):
-    Base.metadata.create_all(bind=engine)
+    await init_redis()
     yield
+    await close_redis()
+    shutdown_hash_executor()
+    await engine.dispose()
 
 
 app = FastAPI(lifespan=startup_event)
+app.add_middleware(RoundTripMiddleware)
 
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+async def get_user_by_username(db: AsyncSession, username: str) -> Optional[User]:
+    result = await db.execute(select(User).where(User.username == username))
+    return result.scalars().first()
 
 
 @app.post("/users", response_model=UserRead)
-def create_user(user: UserCreate, db: Session = Depends(get_db)):
-    db_user = User(
-        username=user.username, password_hash=get_password_hash(user.password)
-    )
+async def create_user(
+    user: UserCreate, request: Request, db: AsyncSession = Depends(get_db)
+):
+    await check_auth_rate_limit(request, "users", user.username)
+    password_hash = await hash_password_async(user.password)
+    db_user = User(username=user.username, password_hash=password_hash)
     db.add(db_user)
     try:
-        db.commit()
+        await db.commit()
     except IntegrityError:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT, detail="Username already exists"
         )
-    db.refresh(db_user)
+    await db.refresh(db_user)
     return db_user
 
 
 @app.post("/token")
-def login(
-    form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)
+async def login(
+    request: Request,
+    form_data: OAuth2PasswordRequestForm = Depends(),
+    db: AsyncSession = Depends(get_db),
 ):
-    user = db.query(User).filter(User.username == form_data.username).first()
-    if not user or not verify_password(form_data.password, user.password_hash):
+    await check_auth_rate_limit(request, "token", form_data.username)
+    user = await get_user_by_username(db, form_data.username)
+    valid, new_hash = (False, None)
+    if user:
+        valid, new_hash = await verify_password_async(
+            form_data.password, user.password_hash
+        )
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid username or password",
         )
-    access_token = create_access_token({"sub": user.username}, timedelta(minutes=30))
-    return {"access_token": access_token, "token_type": "bearer"}
+    if new_hash:
+        # Hash cost changed since this password was stored; upgrade it in place.
+        user.password_hash = new_hash
+        await db.commit()
+    return await issue_tokens(Principal(id=user.id, username=user.username))
 
-@app.get("/users/me", response_model=UserRead)
-def read_users_me(
-    current_username: str = Depends(get_current_user), db: Session = Depends(get_db)
+
+async def issue_tokens(principal: Principal) -> dict:
+    access_token = create_access_token(
+        {"sub": principal.username, "uid": principal.id}, timedelta(minutes=30)
+    )
+    return {
+        "access_token": access_token,
+        "refresh_token": await create_refresh_token(principal),
+        "token_type": "bearer",
+    }
+
+
+@app.post("/token/refresh")
+async def refresh_access_token(body: RefreshRequest):
+    # The old refresh token is deleted on use, so each one works only once.
+    principal = await consume_refresh_token(body.refresh_token)
+    return await issue_tokens(principal)
+
+
+@app.post("/logout", status_code=status.HTTP_204_NO_CONTENT)
+async def logout(
+    body: Optional[RefreshRequest] = None, token: str = Depends(oauth2_scheme)
 ):
-    user = db.query(User).filter(User.username == current_username).first()
-    if user is None:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
-        )
-    return user
+    await revoke_token(token)
+    if body is not None:
+        await revoke_refresh_token(body.refresh_token)
+
+@app.get("/users/me", response_model=UserRead)
+async def read_users_me(principal: Principal = Depends(get_current_principal)):
+    return principal
 
 @app.post("/tasks", response_model=TaskRead)
-def create_task(
+async def create_task(
     task: TaskCreate,
-    db: Session = Depends(get_db),
-    username: str = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+    principal: Principal = Depends(get_current_principal),
 ):
-    owner = (
-        db.query(User).filter(User.username == username).first() if username else None
-    )
     db_task = Task(
         title=task.title,
         description=task.description,
         status=task.status,
         priority=task.priority,
-        owner=owner,
+        owner_id=principal.id,
     )
     db.add(db_task)
-    db.commit()
-    db.refresh(db_task)
-    if username:
-        invalidate_user_cache(username)
+    await db.commit()
+    await db.refresh(db_task)
+    await write_through_tasks(
+        principal.username,
+        created=[db_task],
+        messages=[
+            task_event_message(
+                principal.id, "created", [TaskRead.model_validate(db_task)]
+            )
+        ],
+    )
     return db_task
 
 
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+def task_page_response(page: CachedPage, if_none_match: Optional[str]) -> Response:
+    # no-cache lets browsers keep the body but revalidate with If-None-Match.
+    headers = {"ETag": page.etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(if_none_match, page.etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    if page.next_cursor:
+        headers["X-Next-Cursor"] = page.next_cursor
+    return Response(content=page.body, media_type="application/json", headers=headers)
+
+
 @app.get("/tasks", response_model=List[TaskRead])
-def read_tasks(
+async def read_tasks(
     sort_by: Optional[str] = None,
     search: Optional[str] = None,
     top: Optional[int] = None,
-    db: Session = Depends(get_db),
-    username: str = Depends(get_current_user),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    statuses: Optional[List[str]] = Query(None, alias="status"),
+    priority_min: Optional[int] = None,
+    priority_max: Optional[int] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_db),
+    principal: Principal = Depends(get_current_principal),
+):
+    filters = make_task_filters(
+        statuses, priority_min, priority_max, created_after, created_before
+    )
+    dialect = db.get_bind().dialect.name
+    # Word order and case do not change the matches, so they share a cache entry.
+    terms = sorted(set(search_terms(search)))
+    ranked = bool(terms) and dialect == "postgresql"
+    ordering = get_ordering(sort_by, top, ranked)
+    descriptor = describe_task_query(ordering, terms, top, limit, cursor, filters)
+    if ordering[0][0] != "rank":
+        # Relevance ranking needs ts_rank; every other view, searches sorted
+        # otherwise included, can be derived from the cached task set of a
+        # user below FULL_SET_MAX_TASKS.
+        page = get_derived_page(principal.username, descriptor)
+        if page is not None:
+            return task_page_response(page, if_none_match)
+        task_set = await get_or_load_task_set(
+            principal.username, lambda: query_task_set(db, principal)
+        )
+        if task_set.complete:
+            try:
+                page = derive_task_page(
+                    task_set.tasks,
+                    ordering,
+                    terms,
+                    dialect,
+                    top,
+                    limit,
+                    cursor,
+                    filters,
+                )
+            except ValueError:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor"
+                )
+            set_derived_page(principal.username, task_set, descriptor, page)
+            return task_page_response(page, if_none_match)
+
+    page = await get_or_build_user_tasks(
+        principal.username,
+        descriptor,
+        lambda: query_task_page(
+            db, principal, ordering, terms, top, limit, cursor, filters
+        ),
+    )
+    return task_page_response(page, if_none_match)
+
+
+async def query_task_set(
+    db: AsyncSession, principal: Principal
+) -> Optional[List[Task]]:
+    """All of the user's tasks, or None when there are too many to cache whole."""
+    result = await db.scalars(
+        select(Task)
+        .where(Task.owner_id == principal.id)
+        .order_by(Task.id)
+        .limit(FULL_SET_MAX_TASKS + 1)
+    )
+    tasks = result.all()
+    if len(tasks) > FULL_SET_MAX_TASKS:
+        return None
+    return tasks
+
+
+async def query_task_page(
+    db: AsyncSession,
+    principal: Principal,
+    ordering: Ordering,
+    terms: List[str],
+    top: Optional[int],
+    limit: Optional[int],
+    cursor: Optional[str],
+    filters: TaskFilters,
+):
+    dialect = db.get_bind().dialect.name
+    ranked = ordering[0][0] == "rank"
+    expressions = {"rank": search_rank(terms)} if ranked else {}
+    position = None
+    if cursor:
+        try:
+            position = decode_cursor(cursor, ordering)
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor"
+            )
+    returned = position.returned if position else 0
+
+    page_size = get_page_size(limit, top, returned)
+
+    computed = [expression.label(column) for column, expression in expressions.items()]
+    query = select(Task, *computed).where(
+        Task.owner_id == principal.id, *filter_clauses(filters)
+    )
+    if terms:
+        query = query.where(search_filter(terms, dialect))
+    if position:
+        query = query.where(
+            keyset_predicate(ordering, position.values, expressions)
+        )
+    query = query.order_by(*order_by_clauses(ordering, expressions))
+    if page_size is not None:
+        # One extra row tells whether another page follows.
+        query = query.limit(page_size + 1)
+
+    rows = (await db.execute(query)).all()
+
+    next_cursor = None
+    if page_size is not None and len(rows) > page_size:
+        rows = rows[:page_size]
+        if top is None or returned + page_size < top:
+            last = rows[-1]
+            next_cursor = encode_cursor(
+                ordering,
+                last[0],
+                returned + page_size,
+                {column: getattr(last, column) for column in expressions},
+            )
+
+    return [TaskRead.model_validate(row[0]) for row in rows], next_cursor
+
+
+@app.get("/tasks/export")
+async def export_tasks(
+    export_format: Literal["ndjson", "csv"] = Query("ndjson", alias="format"),
+    db: AsyncSession = Depends(get_db),
+    principal: Principal = Depends(get_current_principal),
 ):
-    cache_key = generate_cache_key(username, sort_by, search, top)
-    cached_result = get_cached_tasks(cache_key)
+    # Plain rows over a server-side cursor keep memory flat for any task count.
+    query = (
+        select(*EXPORT_COLUMNS)
+        .where(Task.owner_id == principal.id)
+        .order_by(Task.id)
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+    )
+    result = await db.stream(query)
+    return StreamingResponse(
+        stream_export(result, export_format),
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers={
+            "Content-Disposition": f'attachment; filename="tasks.{export_format}"'
+        },
+    )
 
-    if cached_result:
-        return [TaskRead(**task) for task in cached_result]
 
-    query = db.query(Task)
-    owner = (
-        db.query(User).filter(User.username == username).first() if username else None
+@app.get("/tasks/changes", response_model=TaskChanges)
+async def read_task_changes(
+    since: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+    principal: Principal = Depends(get_current_principal),
+):
+    """Tasks inserted, updated or deleted since ``since``; everything without it.
+
+    Clients apply ``deleted`` before ``changed`` and pass ``cursor`` back as
+    ``since`` on the next call. A ``full`` response, also sent for cursors
+    older than the tombstone retention, replaces the client's list.
+    """
+    synced_at = utcnow()
+    changed_query = select(Task).where(Task.owner_id == principal.id)
+    deleted: List[int] = []
+    window_start = None
+    if since:
+        try:
+            window_start = decode_sync_cursor(since) - SYNC_OVERLAP
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor"
+            )
+        if window_start < synced_at - TASK_DELETION_RETENTION:
+            window_start = None
+    if window_start is not None:
+        changed_query = changed_query.where(Task.updated_at >= window_start)
+        deleted_ids = await db.scalars(
+            select(TaskDeletion.task_id).where(
+                TaskDeletion.owner_id == principal.id,
+                TaskDeletion.deleted_at >= window_start,
+            )
+        )
+        deleted = sorted(set(deleted_ids))
+    changed = await db.scalars(changed_query.order_by(Task.updated_at, Task.id))
+    return TaskChanges(
+        changed=list(changed),
+        deleted=deleted,
+        cursor=encode_sync_cursor(synced_at),
+        full=window_start is None,
     )
-    if owner:
-        query = query.filter(Task.owner_id == owner.id)
-    if search:
-        search_str = f"%{search}%"
-        query = query.filter(
-            (Task.title.like(search_str)) | (Task.description.like(search_str))
+
+
+async def prune_task_deletions(db: AsyncSession, owner_id: int):
+    """Drop the owner's tombstones older than TASK_DELETION_RETENTION."""
+    await db.execute(
+        delete(TaskDeletion).where(
+            TaskDeletion.owner_id == owner_id,
+            TaskDeletion.deleted_at < utcnow() - TASK_DELETION_RETENTION,
         )
-    if sort_by in ["title", "status", "created_at"]:
-        query = query.order_by(getattr(Task, sort_by))
-    if top is not None:
-        query = query.order_by(Task.priority.desc()).limit(top)
+    )
+
+
+@app.get("/tasks/events")
+async def task_events(principal: Principal = Depends(get_stream_principal)):
+    return StreamingResponse(
+        stream_task_events(principal.id),
+        media_type="text/event-stream",
+        # X-Accel-Buffering stops nginx from buffering the stream.
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
-    db_tasks_result = query.all()
 
-    pydantic_tasks = [
-        TaskRead.model_validate(db_task_item) for db_task_item in db_tasks_result
-    ]
+MAX_BULK_ITEMS = 5000
 
-    set_cached_tasks(cache_key, pydantic_tasks)
-    return pydantic_tasks
+
+def validate_bulk_items(items: List[Any], model: type[BaseModel]):
+    """Validate each item on its own so one bad row does not reject the batch.
+
+    Items that are not objects are reported like any other invalid item.
+    """
+    valid, errors = [], []
+    for index, item in enumerate(items):
+        try:
+            valid.append((index, model.model_validate(item)))
+        except ValidationError as e:
+            item_id = item.get("id") if isinstance(item, dict) else None
+            errors.append(
+                BulkItemError(
+                    index=index,
+                    id=item_id if type(item_id) is int else None,
+                    detail=e.errors(include_url=False, include_context=False),
+                )
+            )
+    return valid, errors
+
+
+async def load_owned_tasks(
+    db: AsyncSession, principal: Principal, indexed_ids: List[tuple]
+):
+    """Split ``(index, task_id)`` pairs into owned tasks and per-item errors."""
+    task_ids = {task_id for _, task_id in indexed_ids}
+    result = await db.execute(select(Task).where(Task.id.in_(task_ids)))
+    tasks = {task.id: task for task in result.scalars()}
+    owned, errors = [], []
+    for index, task_id in indexed_ids:
+        db_task = tasks.get(task_id)
+        if db_task is None:
+            errors.append(
+                BulkItemError(index=index, id=task_id, detail="Task not found")
+            )
+        elif db_task.owner_id and db_task.owner_id != principal.id:
+            errors.append(BulkItemError(index=index, id=task_id, detail="Forbidden"))
+        else:
+            owned.append((index, db_task))
+    return owned, errors
+
+
+@app.post("/tasks/bulk", response_model=BulkTaskResult)
+async def create_tasks_bulk(
+    items: List[Any] = Body(..., max_length=MAX_BULK_ITEMS),
+    db: AsyncSession = Depends(get_db),
+    principal: Principal = Depends(get_current_principal),
+):
+    valid, errors = validate_bulk_items(items, TaskCreate)
+    tasks = []
+    if valid:
+        rows = [{**task.model_dump(), "owner_id": principal.id} for _, task in valid]
+        # A single multi-row INSERT ... RETURNING for the whole batch.
+        result = await db.scalars(
+            insert(Task).returning(Task, sort_by_parameter_order=True), rows
+        )
+        tasks = list(result)
+        await db.commit()
+        await write_through_tasks(
+            principal.username,
+            created=tasks,
+            messages=[
+                task_event_message(
+                    principal.id,
+                    "created",
+                    [TaskRead.model_validate(t) for t in tasks],
+                )
+            ],
+        )
+    return BulkTaskResult(tasks=tasks, errors=errors)
+
+
+@app.post("/tasks/import", response_model=ImportResult)
+async def import_tasks(
+    request: Request,
+    import_format: Optional[Literal["ndjson", "csv"]] = Query(None, alias="format"),
+    db: AsyncSession = Depends(get_db),
+    principal: Principal = Depends(get_current_principal),
+):
+    if import_format is None:
+        content_type = request.headers.get("content-type", "")
+        import_format = "csv" if "csv" in content_type else "ndjson"
+    parse = iter_csv_items if import_format == "csv" else iter_ndjson_items
+
+    imported = 0
+    error_count = 0
+    errors: List[BulkItemError] = []
+    rows: List[Dict[str, Any]] = []
+    created_at = utcnow()
+
+    try:
+        index = -1
+        async for item in parse(request.stream()):
+            index += 1
+            try:
+                if isinstance(item, ValueError):
+                    raise item
+                task = TaskCreate.model_validate(item)
+            except (ValueError, ValidationError) as e:
+                error_count += 1
+                if len(errors) < MAX_IMPORT_ERRORS:
+                    detail = (
+                        e.errors(include_url=False, include_context=False)
+                        if isinstance(e, ValidationError)
+                        else str(e)
+                    )
+                    errors.append(BulkItemError(index=index, detail=detail))
+                continue
+            rows.append(
+                {
+                    **task.model_dump(),
+                    "owner_id": principal.id,
+                    "created_at": created_at,
+                    "updated_at": created_at,
+                    "version": 1,
+                }
+            )
+            if len(rows) >= IMPORT_CHUNK_SIZE:
+                await copy_tasks(db, rows)
+                imported += len(rows)
+                rows = []
+        if rows:
+            await copy_tasks(db, rows)
+            imported += len(rows)
+
+        if imported:
+            # A sync during a long import hands out cursors past the request's
+            # start; stamping at commit keeps the rows inside its overlap.
+            await db.execute(
+                update(Task)
+                .where(Task.owner_id == principal.id, Task.updated_at == created_at)
+                .values(updated_at=utcnow())
+            )
+            await db.commit()
+    finally:
+        if imported:
+            # Also after a failure, in case any of the rows were committed.
+            # Too many rows to push individually; clients refetch instead.
+            await invalidate_user_cache(
+                principal.username, [task_event_message(principal.id, "resync")]
+            )
+    return ImportResult(imported=imported, error_count=error_count, errors=errors)
+
+
+@app.patch("/tasks/bulk", response_model=BulkTaskResult)
+async def update_tasks_bulk(
+    items: List[Any] = Body(..., max_length=MAX_BULK_ITEMS),
+    db: AsyncSession = Depends(get_db),
+    principal: Principal = Depends(get_current_principal),
+):
+    valid, errors = validate_bulk_items(items, TaskBulkUpdate)
+    updates = dict(valid)
+    owned, ownership_errors = await load_owned_tasks(
+        db, principal, [(index, update_data.id) for index, update_data in valid]
+    )
+    for index, db_task in owned:
+        update_data = updates[index]
+        db_task.title = update_data.title
+        db_task.description = update_data.description
+        db_task.status = update_data.status
+        db_task.priority = update_data.priority
+    if owned:
+        await db.commit()
+        await write_through_tasks(
+            principal.username,
+            updated=[db_task for _, db_task in owned],
+            messages=[
+                task_event_message(
+                    principal.id,
+                    "updated",
+                    [TaskRead.model_validate(db_task) for _, db_task in owned],
+                )
+            ],
+        )
+    errors = sorted(errors + ownership_errors, key=lambda error: error.index)
+    return BulkTaskResult(tasks=[db_task for _, db_task in owned], errors=errors)
+
+
+@app.delete("/tasks/bulk", response_model=BulkTaskResult)
+async def delete_tasks_bulk(
+    task_ids: List[int] = Body(..., max_length=MAX_BULK_ITEMS),
+    db: AsyncSession = Depends(get_db),
+    principal: Principal = Depends(get_current_principal),
+):
+    owned, errors = await load_owned_tasks(db, principal, list(enumerate(task_ids)))
+    owners = {db_task.id: db_task.owner_id for _, db_task in owned}
+    deleted = sorted(owners)
+    if deleted:
+        await db.execute(
+            delete(Task)
+            .where(Task.id.in_(deleted))
+            .execution_options(synchronize_session=False)
+        )
+        await db.execute(
+            insert(TaskDeletion),
+            [
+                {"task_id": task_id, "owner_id": owners[task_id]}
+                for task_id in deleted
+            ],
+        )
+        await prune_task_deletions(db, principal.id)
+        await db.commit()
+        await write_through_tasks(
+            principal.username,
+            deleted=deleted,
+            messages=[task_event_message(principal.id, "deleted", deleted=deleted)],
+        )
+    return BulkTaskResult(deleted=deleted, errors=errors)
 
 
 @app.put("/tasks/{task_id}", response_model=TaskRead)
-def update_task(
+async def update_task(
     task_id: int,
     update_data: TaskCreate,
-    db: Session = Depends(get_db),
-    username: str = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+    principal: Principal = Depends(get_current_principal),
 ):
-    db_task = db.query(Task).filter(Task.id == task_id).first()
+    db_task = await db.get(Task, task_id)
     if not db_task:
         raise HTTPException(status_code=404, detail="Task not found")
-    owner = db.query(User).filter(User.username == username).first()
-    if db_task.owner_id and db_task.owner_id != owner.id:
+    if db_task.owner_id and db_task.owner_id != principal.id:
         raise HTTPException(status_code=403)
     db_task.title = update_data.title
     db_task.description = update_data.description
     db_task.status = update_data.status
     db_task.priority = update_data.priority
-    db.commit()
-    db.refresh(db_task)
-    if username:
-        invalidate_user_cache(username)
+    await db.commit()
+    await db.refresh(db_task)
+    await write_through_tasks(
+        principal.username,
+        updated=[db_task],
+        messages=[
+            task_event_message(
+                principal.id, "updated", [TaskRead.model_validate(db_task)]
+            )
+        ],
+    )
     return db_task
 
 
 @app.delete("/tasks/{task_id}")
-def delete_task(
+async def delete_task(
     task_id: int,
-    db: Session = Depends(get_db),
-    username: str = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+    principal: Principal = Depends(get_current_principal),
 ):
-    db_task = db.query(Task).filter(Task.id == task_id).first()
+    db_task = await db.get(Task, task_id)
     if not db_task:
         raise HTTPException(status_code=404, detail="Task not found")
-    owner = db.query(User).filter(User.username == username).first()
-    if db_task.owner_id and db_task.owner_id != owner.id:
+    if db_task.owner_id and db_task.owner_id != principal.id:
         raise HTTPException(status_code=403)
-    db.delete(db_task)
-    db.commit()
-    if username:
-        invalidate_user_cache(username)
+    await db.delete(db_task)
+    db.add(TaskDeletion(task_id=db_task.id, owner_id=db_task.owner_id))
+    await prune_task_deletions(db, principal.id)
+    await db.commit()
+    await write_through_tasks(
+        principal.username,
+        deleted=[task_id],
+        messages=[task_event_message(principal.id, "deleted", deleted=[task_id])],
+    )
     return {"detail": "Task deleted"}
 
 
+@app.get("/metrics/db-pool")
+def read_db_pool_metrics():
+    return get_pool_stats()
+
+
+@app.get("/metrics/cache")
+def read_cache_metrics():
+    return get_cache_stats()
+
+
 @app.get("/")
 def read_root():
     return {"message": "Welcome to FastAPI app"}
@@ -1,24 +1,40 @@
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Query, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from passlib.context import CryptContext
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from collections import OrderedDict
 from datetime import datetime, timezone, timedelta
-from typing import Optional
-from secrets import token_hex
+from typing import Dict, Optional
+from secrets import token_hex, token_urlsafe
+import hashlib
 import jwt
+import math
 import os
+import time
+
+from app import cache
+from app.cache import TTLCache, register_channel_handler
+from app.database import get_db
+from app.models import User
+from app.passwords import get_password_hash, pwd_context, verify_password  # noqa: F401
+from app.schemas import Principal
 
 SECRET_KEY = os.getenv("SECRET_KEY", token_hex(32))
 ALGORITHM = "HS256"
-pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token", auto_error=False)
 
+USER_ID_CACHE_SIZE = 10000
+user_id_cache: "OrderedDict[str, int]" = OrderedDict()
 
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
-
-
-def get_password_hash(password):
-    return pwd_context.hash(password)
+# Verified tokens keyed by SHA-256 digest; entries never outlive the token's exp.
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+TOKEN_CACHE_MAX_TTL = 3600
+REVOCATION_CHANNEL = "auth:revoke"
+REFRESH_TOKEN_TTL = int(os.getenv("REFRESH_TOKEN_TTL", str(7 * 24 * 3600)))
+token_cache = TTLCache(TOKEN_CACHE_SIZE, TOKEN_CACHE_MAX_TTL)
+# Digest -> exp of revoked tokens that have not expired yet.
+revoked_tokens: Dict[bytes, float] = {}
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
@@ -31,7 +47,7 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
-def get_current_user(token: str = Depends(oauth2_scheme)):
+def decode_access_token(token: str) -> dict:
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
@@ -40,7 +56,7 @@ def get_current_user(token: str = Depends(oauth2_scheme)):
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid authentication credentials",
             )
-        return username
+        return payload
     except jwt.ExpiredSignatureError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Token expired"
@@ -54,3 +70,154 @@ def get_current_user(token: str = Depends(oauth2_scheme)):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Authentication failed"
         )
+
+
+def get_current_user(token: str = Depends(oauth2_scheme)):
+    return decode_access_token(token)["sub"]
+
+
+def token_digest(token: str) -> bytes:
+    return hashlib.sha256(token.encode()).digest()
+
+
+def revoked_token_key(digest: bytes) -> str:
+    return f"auth:revoked:{digest.hex()}"
+
+
+def mark_token_revoked(digest: bytes, exp: float):
+    token_cache.pop(digest)
+    now = time.time()
+    for revoked, revoked_exp in list(revoked_tokens.items()):
+        if revoked_exp <= now:
+            del revoked_tokens[revoked]
+    revoked_tokens[digest] = exp
+
+
+def handle_revocation_message(data: bytes):
+    digest, _, exp = data.decode().partition(":")
+    mark_token_revoked(bytes.fromhex(digest), float(exp))
+
+
+register_channel_handler(
+    REVOCATION_CHANNEL, handle_revocation_message, reset=token_cache.clear
+)
+
+
+async def verify_token(token: str) -> dict:
+    """Decode ``token``, skipping signature verification for recently seen ones.
+
+    Revocations are checked in Redis only on a miss; cached entries are dropped
+    by the pub/sub revocation message instead.
+    """
+    digest = token_digest(token)
+    payload = token_cache.get(digest)
+    if payload is not None:
+        return payload
+    payload = decode_access_token(token)
+    revoked = digest in revoked_tokens or await cache.redis_client.exists(
+        revoked_token_key(digest)
+    )
+    # The revocation message may have been handled while EXISTS was pending.
+    if revoked or digest in revoked_tokens:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="Token revoked"
+        )
+    exp = payload.get("exp")
+    if exp is not None:
+        token_cache.set(digest, payload, ttl=exp - time.time())
+    return payload
+
+
+async def revoke_token(token: str):
+    payload = await verify_token(token)
+    digest = token_digest(token)
+    exp = payload.get("exp", time.time() + TOKEN_CACHE_MAX_TTL)
+    await cache.redis_client.set(
+        revoked_token_key(digest), 1, ex=max(1, math.ceil(exp - time.time()))
+    )
+    await cache.redis_client.publish(REVOCATION_CHANNEL, f"{digest.hex()}:{exp}")
+    mark_token_revoked(digest, exp)
+
+
+def refresh_token_key(refresh_token: str) -> str:
+    return f"auth:refresh:{hashlib.sha256(refresh_token.encode()).hexdigest()}"
+
+
+async def create_refresh_token(principal: Principal) -> str:
+    """Opaque token stored in Redis; only its digest is kept server-side."""
+    refresh_token = token_urlsafe(32)
+    await cache.redis_client.set(
+        refresh_token_key(refresh_token),
+        f"{principal.id}:{principal.username}",
+        ex=REFRESH_TOKEN_TTL,
+    )
+    return refresh_token
+
+
+async def consume_refresh_token(refresh_token: str) -> Principal:
+    """Redeem a refresh token exactly once; the caller issues its replacement."""
+    value = await cache.redis_client.getdel(refresh_token_key(refresh_token))
+    if value is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid refresh token"
+        )
+    user_id, _, username = value.decode().partition(":")
+    return Principal(id=int(user_id), username=username)
+
+
+async def revoke_refresh_token(refresh_token: str):
+    await cache.redis_client.delete(refresh_token_key(refresh_token))
+
+
+async def lookup_user_id(db: AsyncSession, username: str) -> Optional[int]:
+    user_id = user_id_cache.get(username)
+    if user_id is not None:
+        user_id_cache.move_to_end(username)
+        return user_id
+    result = await db.execute(select(User.id).where(User.username == username))
+    user_id = result.scalar_one_or_none()
+    if user_id is not None:
+        user_id_cache[username] = user_id
+        if len(user_id_cache) > USER_ID_CACHE_SIZE:
+            user_id_cache.popitem(last=False)
+    return user_id
+
+
+async def get_current_principal(
+    token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)
+) -> Principal:
+    payload = await verify_token(token)
+    username = payload["sub"]
+    user_id = payload.get("uid")
+    if user_id is None:
+        # Tokens issued before "uid" was added to the claims.
+        user_id = await lookup_user_id(db, username)
+        if user_id is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Invalid authentication credentials",
+            )
+    return Principal(id=user_id, username=username)
+
+
+async def get_stream_principal(
+    token: Optional[str] = Depends(optional_oauth2_scheme),
+    access_token: Optional[str] = Query(None),
+    db: AsyncSession = Depends(get_db),
+) -> Principal:
+    """Like ``get_current_principal`` but also accepts ``?access_token=``.
+
+    EventSource cannot send headers. The session is closed right away so a
+    long-lived stream does not pin a pooled connection.
+    """
+    token = token or access_token
+    if not token:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    try:
+        return await get_current_principal(token, db)
+    finally:
+        await db.close()
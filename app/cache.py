@@ -1,44 +1,836 @@
-import redis
-import json
+import redis.asyncio as redis
+import asyncio
+import hashlib
+import math
+import orjson
 import os
-from typing import Optional, List
+import random
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from secrets import token_hex
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    NamedTuple,
+    Optional,
+    List,
+    Sequence,
+    Tuple,
+)
+from app.filters import TaskFilters, filters_cache_fragment
+from app.models import Task
 from app.schemas import TaskRead
-from redis import ConnectionPool
 
 redis_host = os.getenv("REDIS_HOST", "localhost")
-redis_pool = ConnectionPool(
-    host=redis_host, port=6379, db=0, decode_responses=True, max_connections=100
-)
-redis_client = redis.Redis(connection_pool=redis_pool)
+redis_pool: Optional[redis.ConnectionPool] = None
+redis_client: Optional[redis.Redis] = None
+invalidation_listener: Optional[asyncio.Task] = None
 
 CACHE_TTL = 300
+L1_CACHE_SIZE = int(os.getenv("L1_CACHE_SIZE", "1024"))
+L1_CACHE_TTL = float(os.getenv("L1_CACHE_TTL", "30"))
+# Each task set holds up to FULL_SET_MAX_TASKS parsed tasks, so far fewer fit.
+L1_TASK_SETS_SIZE = int(os.getenv("L1_TASK_SETS_SIZE", "64"))
+# Cached pages kept per user; the least recently written ones are evicted.
+MAX_CACHED_VARIANTS = int(os.getenv("MAX_CACHED_VARIANTS", "100"))
+INVALIDATION_CHANNEL = "tasks:invalidate"
+
+# Single-flight rebuilds: one request per cache key queries the database while
+# the others wait up to REBUILD_WAIT seconds for its result.
+REBUILD_LOCK_TTL_MS = 5000
+REBUILD_POLL_INTERVAL = 0.05
+REBUILD_WAIT = 2.0
+# XFetch: a page is rebuilt early with probability rising as expiry nears,
+# scaled by how long the last rebuild took.
+XFETCH_BETA = float(os.getenv("XFETCH_BETA", "1.0"))
+# Users with up to this many tasks are cached as one hash of id -> task JSON,
+# and every list view is derived from it in memory.
+FULL_SET_MAX_TASKS = int(os.getenv("FULL_SET_MAX_TASKS", "1000"))
+TASK_SET_GENERATION = b"_gen"
+# How long a user found above FULL_SET_MAX_TASKS skips the task set. Kept
+# outside the generation, so writes do not re-measure the user every time.
+TASK_SET_TOO_LARGE_TTL = int(os.getenv("TASK_SET_TOO_LARGE_TTL", "3600"))
+# Scripts read keys they derive from their arguments, so like the rest of this
+# module they assume a single Redis node rather than a cluster.
+# ARGV: page key prefix and query digest; the generation completes the key.
+READ_PAGE_SCRIPT = """
+local generation = redis.call("get", KEYS[1]) or "0"
+return {generation, redis.call("get", ARGV[1] .. generation .. ":" .. ARGV[2])}
+"""
+# Stores a page, evicts the user's oldest pages over the cap and releases the
+# rebuild lock if ARGV[5] still holds it. Returns the evicted keys.
+STORE_PAGE_SCRIPT = """
+redis.call("set", KEYS[1], ARGV[1], "EX", ARGV[2])
+redis.call("zadd", KEYS[2], ARGV[3], KEYS[1])
+redis.call("expire", KEYS[2], ARGV[2])
+local evicted = redis.call("zrange", KEYS[2], 0, -(tonumber(ARGV[4]) + 1))
+if #evicted > 0 then
+    redis.call("zrem", KEYS[2], unpack(evicted))
+    redis.call("del", unpack(evicted))
+end
+if redis.call("get", KEYS[3]) == ARGV[5] then
+    redis.call("del", KEYS[3])
+end
+return evicted
+"""
+STORE_TASK_SET_SCRIPT = """
+if (redis.call("get", KEYS[1]) or "0") ~= ARGV[1] then
+    return 0
+end
+redis.call("del", KEYS[2])
+redis.call("hset", KEYS[2], "_gen", ARGV[1])
+-- In slices: unpack() fails past a few thousand values.
+for i = 3, #ARGV, 1000 do
+    redis.call("hset", KEYS[2], unpack(ARGV, i, math.min(i + 999, #ARGV)))
+end
+redis.call("expire", KEYS[2], ARGV[2])
+return 1
+"""
+# With write-through, task mutations patch the cached task set in place so it
+# stays warm; the generation bump still invalidates every cached page.
+CACHE_WRITE_THROUGH = os.getenv("CACHE_WRITE_THROUGH", "0") == "1"
+# Bumps the generation and announces it on ARGV[1] as "<ARGV[2]>:<gen>",
+# followed by ARGV[3] (channel, message) pairs, e.g. task events.
+BUMP_GENERATION_LUA = """
+local generation = redis.call("incr", KEYS[1])
+redis.call("publish", ARGV[1], ARGV[2] .. ":" .. generation)
+local first = 4 + 2 * tonumber(ARGV[3])
+for i = 4, first - 1, 2 do
+    redis.call("publish", ARGV[i], ARGV[i + 1])
+end
+"""
+INVALIDATE_SCRIPT = BUMP_GENERATION_LUA + "return generation"
+# Also carries the task set over to the new generation when it was current.
+# ARGV after the announcements: ttl, max fields, then (op, id, version, json)
+# per task. "_v:<id>" holds the version last written, so a late patch cannot
+# undo a newer one, and "deleted" once the task is gone.
+PATCH_TASK_SET_SCRIPT = BUMP_GENERATION_LUA + """
+if redis.call("hget", KEYS[2], "_gen") ~= tostring(generation - 1) then
+    return generation
+end
+for i = first + 2, #ARGV, 4 do
+    local id, version_field = ARGV[i + 1], "_v:" .. ARGV[i + 1]
+    local current = redis.call("hget", KEYS[2], version_field)
+    if ARGV[i] == "delete" then
+        redis.call("hdel", KEYS[2], id)
+        redis.call("hset", KEYS[2], version_field, "deleted")
+    elseif ARGV[i] == "create" or (current ~= "deleted"
+            and tonumber(current or "0") < tonumber(ARGV[i + 2])) then
+        redis.call("hset", KEYS[2], id, ARGV[i + 3], version_field, ARGV[i + 2])
+    end
+end
+if redis.call("hlen", KEYS[2]) > tonumber(ARGV[first + 1]) then
+    -- Grown past the limit; the next read reloads and measures it.
+    redis.call("del", KEYS[2])
+    return generation
+end
+redis.call("hset", KEYS[2], "_gen", generation)
+redis.call("expire", KEYS[2], ARGV[first])
+return generation
+"""
+RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+# Other pub/sub channels served by the same listener, e.g. token revocations.
+channel_handlers: Dict[str, Callable[[bytes], None]] = {}
+# Called when the listener reconnects and may have missed messages.
+reset_callbacks: List[Callable[[], None]] = []
+
+
+class RoundTripCounter:
+    def __init__(self):
+        self.count = 0
+
+
+# Redis round trips of the request being served, set by RoundTripMiddleware.
+request_round_trips: ContextVar[Optional[RoundTripCounter]] = ContextVar(
+    "request_round_trips", default=None
+)
+
+
+class CountingConnection(redis.Connection):
+    """Counts each command or pipeline sent to Redis, i.e. each round trip."""
+
+    async def send_packed_command(self, command, check_health: bool = True):
+        cache_stats["round_trips"] += 1
+        counter = request_round_trips.get()
+        if counter is not None:
+            counter.count += 1
+        await super().send_packed_command(command, check_health)
+
+
+class RoundTripMiddleware:
+    """Reports a request's Redis round trips in the X-Redis-Round-Trips header.
+
+    Counted until the response starts, which for cached reads is all of them.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        counter = RoundTripCounter()
+        token = request_round_trips.set(counter)
+
+        async def send_with_count(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [
+                    *message.get("headers", ()),
+                    (b"x-redis-round-trips", str(counter.count).encode()),
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_count)
+        finally:
+            request_round_trips.reset(token)
+
+
+class TTLCache:
+    """Bounded in-process LRU cache whose entries also expire after a TTL."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Any, tuple]" = OrderedDict()
+
+    def get(self, key):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key, value, ttl: Optional[float] = None):
+        """``ttl`` overrides the cache-wide TTL for this entry."""
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key):
+        entry = self._data.pop(key, None)
+        return entry[1] if entry else None
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class CachedPage(NamedTuple):
+    body: bytes
+    next_cursor: Optional[str] = None
+    etag: Optional[str] = None
+    # Wall-clock expiry and rebuild duration in seconds, for early refresh.
+    expires_at: Optional[float] = None
+    delta: float = 0.0
+
+
+local_generations = TTLCache(L1_CACHE_SIZE, L1_CACHE_TTL)
+local_tasks = TTLCache(L1_CACHE_SIZE, L1_CACHE_TTL)
+local_task_sets = TTLCache(L1_TASK_SETS_SIZE, L1_CACHE_TTL)
+# Users above FULL_SET_MAX_TASKS, whose reads go straight to the page cache.
+local_too_large = TTLCache(L1_CACHE_SIZE, L1_CACHE_TTL)
+cache_stats = {
+    "l1_hits": 0,
+    "l1_misses": 0,
+    "redis_hits": 0,
+    "redis_misses": 0,
+    "rebuilds": 0,
+    "early_refreshes": 0,
+    "task_set_l1_hits": 0,
+    "task_set_redis_hits": 0,
+    "task_set_misses": 0,
+    "round_trips": 0,
+}
+# Rebuilds running in this worker, shared by concurrent misses on the same key.
+inflight_rebuilds: Dict[str, asyncio.Future] = {}
+
+
+async def init_redis():
+    global redis_pool, redis_client, invalidation_listener
+    redis_pool = redis.ConnectionPool(
+        host=redis_host,
+        port=6379,
+        db=0,
+        max_connections=100,
+        connection_class=CountingConnection,
+    )
+    redis_client = redis.Redis(connection_pool=redis_pool)
+    invalidation_listener = asyncio.create_task(listen_for_invalidations())
+
+
+async def close_redis():
+    global redis_pool, redis_client, invalidation_listener
+    if invalidation_listener is not None:
+        invalidation_listener.cancel()
+        try:
+            await invalidation_listener
+        except asyncio.CancelledError:
+            pass
+    if redis_client is not None:
+        await redis_client.aclose()
+    if redis_pool is not None:
+        await redis_pool.disconnect()
+    invalidation_listener = None
+    redis_client = None
+    redis_pool = None
+
+
+def clear_local_cache():
+    local_generations.clear()
+    local_tasks.clear()
+    local_task_sets.clear()
+    local_too_large.clear()
+
+
+def get_cache_stats() -> dict:
+    return {
+        "pid": os.getpid(),
+        "l1_entries": len(local_tasks),
+        **cache_stats,
+    }
+
+
+def generation_key(username: str) -> str:
+    return f"tasks:{username}:gen"
+
+
+def apply_generation(username: str, generation: int):
+    # Pub/sub messages can arrive out of order; never step a generation back.
+    current = local_generations.get(username)
+    if current is None or generation > current:
+        local_generations.set(username, generation)
+
+
+def handle_invalidation_message(data: bytes):
+    username, _, generation = data.decode().rpartition(":")
+    apply_generation(username, int(generation))
+
+
+def register_channel_handler(
+    channel: str,
+    handler: Callable[[bytes], None],
+    reset: Optional[Callable[[], None]] = None,
+):
+    """Must be called before ``init_redis`` starts the listener."""
+    channel_handlers[channel] = handler
+    if reset is not None:
+        reset_callbacks.append(reset)
+
+
+async def listen_for_invalidations():
+    handlers = {INVALIDATION_CHANNEL: handle_invalidation_message, **channel_handlers}
+    while True:
+        try:
+            async with redis_client.pubsub() as pubsub:
+                await pubsub.subscribe(*handlers)
+                async for message in pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+                    channel = message["channel"].decode()
+                    try:
+                        handlers[channel](message["data"])
+                    except Exception as e:
+                        # A malformed message must not stop the listener, or
+                        # this worker would keep stale generations and tokens.
+                        print(f"Cache invalidation handler error on {channel}: {e!r}")
+        except redis.RedisError as e:
+            # Messages may have been missed while disconnected.
+            print(f"Cache invalidation listener error: {str(e)}")
+            local_generations.clear()
+            for reset in reset_callbacks:
+                reset()
+            await asyncio.sleep(1)
+
+
+def describe_task_query(
+    ordering: List[Tuple[str, bool]],
+    terms: List[str],
+    top: Optional[int],
+    limit: Optional[int],
+    cursor: Optional[str],
+    filters: TaskFilters,
+) -> bytes:
+    """Canonical description of a task page; equivalent queries describe alike.
+
+    Callers pass the resolved ordering rather than ``sort_by``, so unknown or
+    redundant sort values collapse onto the ordering actually used.
+    """
+    return orjson.dumps(
+        {
+            "order": ordering,
+            "terms": terms,
+            "top": top,
+            "limit": limit,
+            "cursor": cursor,
+            "filters": filters_cache_fragment(filters),
+        }
+    )
+
+
+def variants_key(cache_key: str) -> str:
+    """Set of a user's cached pages, derived from ``tasks:<user>:v<gen>:<hash>``."""
+    return cache_key.rsplit(":", 2)[0] + ":variants"
+
+
+def page_key_prefix(username: str) -> str:
+    return f"tasks:{username}:v"
+
+
+def page_cache_key(username: str, generation: int, digest: str) -> str:
+    return f"{page_key_prefix(username)}{generation}:{digest}"
+
+
+def descriptor_digest(descriptor: bytes) -> str:
+    # Fixed-size keys: the query descriptor is hashed, whatever its length.
+    return hashlib.blake2b(descriptor, digest_size=16).hexdigest()
+
+
+def serialize_tasks(tasks: List[TaskRead]) -> bytes:
+    # Produces the same JSON as FastAPI's response_model serialization.
+    return orjson.dumps(
+        [task.model_dump() for task in tasks], option=orjson.OPT_UTC_Z
+    )
+
+
+def pack_page(page: CachedPage) -> bytes:
+    # Cursors are base64url and can never contain the space or newline separators.
+    header = f"{page.expires_at or 0:.3f} {page.delta:.4f} {page.next_cursor or ''}"
+    return header.encode() + b"\n" + page.body
+
+
+def page_etag(body: bytes, next_cursor: Optional[str] = None) -> str:
+    """Strong validator over the body and cursor header of a page."""
+    digest = hashlib.blake2b((next_cursor or "").encode(), digest_size=16)
+    digest.update(b"\n")
+    digest.update(body)
+    return '"' + digest.hexdigest() + '"'
 
-def generate_cache_key(
-    username: str,
-    sort_by: Optional[str] = None,
-    search: Optional[str] = None,
-    top: Optional[int] = None,
-) -> str:
-    return f"tasks:{username}:sort={sort_by}:search={search}:top={top}"
 
+def unpack_page(data: bytes) -> CachedPage:
+    header, _, body = data.partition(b"\n")
+    fields = header.decode().split(" ")
+    if len(fields) == 3:
+        expires_at, delta, next_cursor = float(fields[0]), float(fields[1]), fields[2]
+    else:
+        # Written before pages carried expiry information.
+        expires_at, delta, next_cursor = None, 0.0, fields[0]
+    next_cursor = next_cursor or None
+    return CachedPage(
+        body, next_cursor, page_etag(body, next_cursor), expires_at or None, delta
+    )
 
-def get_cached_tasks(cache_key: str) -> Optional[List[dict]]:
-    cached_data = redis_client.get(cache_key)
-    if cached_data:
-        return json.loads(cached_data)
-    return None
 
+def cache_page_data(cache_key: str, data: Optional[bytes]) -> Optional[CachedPage]:
+    if data is None:
+        cache_stats["redis_misses"] += 1
+        return None
+    cache_stats["redis_hits"] += 1
+    page = unpack_page(data)
+    local_tasks.set(cache_key, page)
+    return page
 
-def set_cached_tasks(cache_key: str, tasks: List[TaskRead]):
-    tasks_data = [task.model_dump(mode="json") for task in tasks]
-    redis_client.setex(cache_key, CACHE_TTL, json.dumps(tasks_data))
 
+async def get_cached_tasks(cache_key: str) -> Optional[CachedPage]:
+    """Return the cached JSON body for ``cache_key`` ready to be sent as is."""
+    page = local_tasks.get(cache_key)
+    if page is not None:
+        cache_stats["l1_hits"] += 1
+        return page
+    cache_stats["l1_misses"] += 1
+    return cache_page_data(cache_key, await redis_client.get(cache_key))
+
+
+async def get_user_page(
+    username: str, descriptor: bytes
+) -> Tuple[str, Optional[CachedPage]]:
+    """Cache key and cached page of a query, in at most one round trip.
+
+    Without a local generation, one script reads it and the page it selects.
+    """
+    digest = descriptor_digest(descriptor)
+    generation = local_generations.get(username)
+    if generation is not None:
+        cache_key = page_cache_key(username, generation, digest)
+        return cache_key, await get_cached_tasks(cache_key)
+
+    cache_stats["l1_misses"] += 1
+    generation, data = await redis_client.eval(
+        READ_PAGE_SCRIPT, 1, generation_key(username), page_key_prefix(username), digest
+    )
+    generation = int(generation)
+    apply_generation(username, generation)
+    cache_key = page_cache_key(username, generation, digest)
+    return cache_key, cache_page_data(cache_key, data)
+
+
+async def set_cached_tasks(
+    cache_key: str,
+    tasks: List[TaskRead],
+    next_cursor: Optional[str] = None,
+    delta: float = 0.0,
+    lock_token: str = "",
+) -> CachedPage:
+    """Store a page in one round trip.
+
+    Also releases the rebuild lock if ``lock_token`` still holds it.
+    """
+    body = serialize_tasks(tasks)
+    page = CachedPage(
+        body, next_cursor, page_etag(body, next_cursor), time.time() + CACHE_TTL, delta
+    )
+    # Pages of older generations are the oldest variants and are evicted first.
+    evicted = await redis_client.eval(
+        STORE_PAGE_SCRIPT,
+        3,
+        cache_key,
+        variants_key(cache_key),
+        rebuild_lock_key(cache_key),
+        pack_page(page),
+        CACHE_TTL,
+        time.time(),
+        MAX_CACHED_VARIANTS,
+        lock_token,
+    )
+    for key in evicted:
+        local_tasks.pop(key.decode())
+    local_tasks.set(cache_key, page)
+    return page
+
+
+PageBuilder = Callable[[], Awaitable[Tuple[List[TaskRead], Optional[str]]]]
+
+
+def rebuild_lock_key(cache_key: str) -> str:
+    return f"lock:{cache_key}"
+
+
+def should_refresh_early(page: CachedPage) -> bool:
+    if page.expires_at is None:
+        return False
+    jitter = page.delta * XFETCH_BETA * -math.log(1.0 - random.random())
+    return time.time() + jitter >= page.expires_at
+
+
+async def build_and_store(
+    cache_key: str, build: PageBuilder, lock_token: str = ""
+) -> CachedPage:
+    """The store releases the lock held with ``lock_token``; so does a failed build."""
+    cache_stats["rebuilds"] += 1
+    started = time.monotonic()
+    try:
+        tasks, next_cursor = await build()
+    except BaseException:
+        if lock_token:
+            await release_rebuild_lock(cache_key, lock_token)
+        raise
+    return await set_cached_tasks(
+        cache_key, tasks, next_cursor, time.monotonic() - started, lock_token
+    )
+
+
+async def release_rebuild_lock(cache_key: str, lock_token: str):
+    await redis_client.eval(
+        RELEASE_LOCK_SCRIPT, 1, rebuild_lock_key(cache_key), lock_token
+    )
+
+
+async def rebuild_with_lock(cache_key: str, build: PageBuilder) -> CachedPage:
+    """Rebuild under a Redis lock so only one worker queries the database."""
+    lock_key = rebuild_lock_key(cache_key)
+    token = token_hex(8)
+    deadline = time.monotonic() + REBUILD_WAIT
+    while True:
+        if await redis_client.set(lock_key, token, nx=True, px=REBUILD_LOCK_TTL_MS):
+            return await build_and_store(cache_key, build, token)
+        await asyncio.sleep(REBUILD_POLL_INTERVAL)
+        data = await redis_client.get(cache_key)
+        if data is not None:
+            page = unpack_page(data)
+            local_tasks.set(cache_key, page)
+            return page
+        if time.monotonic() >= deadline:
+            # The lock holder is slow or gone; serve this request ourselves.
+            return await build_and_store(cache_key, build)
+
+
+async def get_or_build_user_tasks(
+    username: str, descriptor: bytes, build: PageBuilder
+) -> CachedPage:
+    """Cached page ``descriptor`` selects for ``username``; ``build`` runs at
+    most once per key at a time.
+
+    Close to expiry one request refreshes the page early while the rest keep
+    being served the current one. A cached page costs at most one round trip;
+    a rebuild adds the lock and one store.
+    """
+    cache_key, page = await get_user_page(username, descriptor)
+    return await serve_page(cache_key, page, build)
+
+
+async def serve_page(
+    cache_key: str, page: Optional[CachedPage], build: PageBuilder
+) -> CachedPage:
+    if page is not None:
+        if not should_refresh_early(page):
+            return page
+        lock_key = rebuild_lock_key(cache_key)
+        token = token_hex(8)
+        if not await redis_client.set(lock_key, token, nx=True, px=REBUILD_LOCK_TTL_MS):
+            return page
+        cache_stats["early_refreshes"] += 1
+        return await build_and_store(cache_key, build, token)
+
+    return await single_flight(cache_key, lambda: rebuild_with_lock(cache_key, build))
+
+
+async def single_flight(key: str, run: Callable[[], Awaitable[Any]]):
+    """Run ``run`` once per ``key`` in this worker; concurrent callers share it."""
+    while True:
+        future = inflight_rebuilds.get(key)
+        if future is None:
+            break
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            if not future.cancelled():
+                raise
+            # The request that was rebuilding went away; take over.
+
+    future = asyncio.get_running_loop().create_future()
+    # Marks a failure as retrieved even when no other request was waiting.
+    future.add_done_callback(lambda f: f.cancelled() or f.exception())
+    inflight_rebuilds[key] = future
+    try:
+        result = await run()
+    except BaseException as e:
+        if isinstance(e, asyncio.CancelledError):
+            future.cancel()
+        else:
+            future.set_exception(e)
+        raise
+    else:
+        future.set_result(result)
+        return result
+    finally:
+        del inflight_rebuilds[key]
+
+
+class CachedTask(NamedTuple):
+    task: TaskRead
+    # The task's JSON, spliced into response bodies as is.
+    raw: bytes
+
+
+class TaskSet(NamedTuple):
+    """All of a user's tasks, or ``complete=False`` for users above the limit."""
+
+    tasks: List[CachedTask] = []
+    complete: bool = True
+    # The cache generation the tasks were read at.
+    generation: Optional[int] = None
+
+
+# Loaders return Task rows: the stored set also records each task's version.
+TaskSetLoader = Callable[[], Awaitable[Optional[List[Task]]]]
+
+
+def task_set_key(username: str) -> str:
+    return f"tasks:{username}:set"
+
+
+def task_set_too_large_key(username: str) -> str:
+    return f"tasks:{username}:set:too_large"
+
+
+def cached_task(task) -> CachedTask:
+    task = TaskRead.model_validate(task)
+    return CachedTask(task, orjson.dumps(task.model_dump(), option=orjson.OPT_UTC_Z))
+
+
+def task_version_field(task_id: int) -> bytes:
+    return b"_v:" + str(task_id).encode()
+
+
+def unpack_task_set(data: Dict[bytes, bytes], generation: int) -> TaskSet:
+    return TaskSet(
+        [
+            CachedTask(TaskRead.model_validate_json(raw), raw)
+            for field, raw in data.items()
+            if not field.startswith(b"_")
+        ],
+        generation=generation,
+    )
+
+
+async def get_or_load_task_set(username: str, load: TaskSetLoader) -> TaskSet:
+    """The user's task set from L1, Redis or ``load``; valid for one generation.
+
+    A generation bump makes the stored set stale, so invalidation stays a
+    single INCR. Users known to be too large cost no round trip, so their
+    cached pages are still served in one.
+    """
+    if local_too_large.get(username):
+        return TaskSet(complete=False)
+    generation = local_generations.get(username)
+    task_set = local_task_sets.get((username, generation))
+    if task_set is not None:
+        cache_stats["task_set_l1_hits"] += 1
+        return task_set
+
+    # The generation, the set and the size flag, in one round trip. A
+    # transaction rather than a script: copying a large hash through Lua costs
+    # more than sending it.
+    async with redis_client.pipeline(transaction=True) as pipe:
+        pipe.get(generation_key(username))
+        pipe.hgetall(task_set_key(username))
+        pipe.exists(task_set_too_large_key(username))
+        generation, data, too_large = await pipe.execute()
+    generation = int(generation or 0)
+    apply_generation(username, generation)
+    if too_large:
+        local_too_large.set(username, True)
+        return TaskSet(complete=False)
+    if data.get(TASK_SET_GENERATION) == str(generation).encode():
+        cache_stats["task_set_redis_hits"] += 1
+        task_set = unpack_task_set(data, generation)
+        local_task_sets.set((username, generation), task_set)
+        return task_set
+
+    cache_stats["task_set_misses"] += 1
+    # Per generation: a read after a write must not join a load started before it.
+    return await single_flight(
+        f"{task_set_key(username)}:{generation}",
+        lambda: load_task_set(username, generation, load),
+    )
+
+
+async def load_task_set(
+    username: str, generation: int, load: TaskSetLoader
+) -> TaskSet:
+    tasks = await load()
+    if tasks is None:
+        await redis_client.set(
+            task_set_too_large_key(username), 1, ex=TASK_SET_TOO_LARGE_TTL
+        )
+        local_too_large.set(username, True)
+        return TaskSet(complete=False)
+    task_set = TaskSet([cached_task(task) for task in tasks], generation=generation)
+    fields = []
+    for task, entry in zip(tasks, task_set.tasks):
+        fields += [str(task.id).encode(), entry.raw]
+        fields += [task_version_field(task.id), str(task.version).encode()]
+    # Not stored if a write bumped the generation while the set was loading.
+    stored = await redis_client.eval(
+        STORE_TASK_SET_SCRIPT,
+        2,
+        generation_key(username),
+        task_set_key(username),
+        generation,
+        CACHE_TTL,
+        *fields,
+    )
+    if stored:
+        local_task_sets.set((username, generation), task_set)
+    return task_set
+
+
+def get_derived_page(username: str, descriptor: bytes) -> Optional[CachedPage]:
+    """Page this worker derived from the task set at the current generation.
+
+    Repeated and conditional requests are answered without loading the set.
+    """
+    generation = local_generations.get(username)
+    if generation is None:
+        return None
+    page = local_tasks.get(
+        page_cache_key(username, generation, descriptor_digest(descriptor))
+    )
+    if page is not None:
+        cache_stats["l1_hits"] += 1
+    return page
+
+
+def set_derived_page(
+    username: str, task_set: TaskSet, descriptor: bytes, page: CachedPage
+):
+    cache_key = page_cache_key(
+        username, task_set.generation, descriptor_digest(descriptor)
+    )
+    local_tasks.set(cache_key, page)
+
+
+Messages = Sequence[Tuple[str, bytes]]
+
+
+def announcement_args(username: str, messages: Messages) -> list:
+    args = [INVALIDATION_CHANNEL, username, len(messages)]
+    for channel, message in messages:
+        args += [channel, message]
+    return args
+
+
+async def invalidate_user_cache(username: str, messages: Messages = ()):
+    """Bump the user's generation and publish it, then ``messages``, atomically.
+
+    Entries of older generations are never read again and expire via CACHE_TTL.
+    """
+    generation = await redis_client.eval(
+        INVALIDATE_SCRIPT,
+        1,
+        generation_key(username),
+        *announcement_args(username, messages),
+    )
+    apply_generation(username, generation)
+
+
+async def write_through_tasks(
+    username: str,
+    created: Sequence[Task] = (),
+    updated: Sequence[Task] = (),
+    deleted: Sequence[int] = (),
+    messages: Messages = (),
+):
+    """Invalidate the user's cached pages after committed task changes.
 
-def invalidate_user_cache(username: str):
-    pattern = f"tasks:{username}:*"
-    keys_to_delete = []
-    for key in redis_client.scan_iter(match=pattern):
-        keys_to_delete.append(key)
-    
-    if keys_to_delete:
-        redis_client.delete(*keys_to_delete)
\ No newline at end of file
+    With CACHE_WRITE_THROUGH the task set moves to the new generation with
+    the changes applied, in the same script, instead of being reloaded by
+    the next read. Otherwise this is ``invalidate_user_cache``.
+    """
+    if not CACHE_WRITE_THROUGH:
+        return await invalidate_user_cache(username, messages)
+    changes = []
+    for op, tasks in (("create", created), ("update", updated)):
+        for task in tasks:
+            changes += [op, task.id, task.version, cached_task(task).raw]
+    for task_id in deleted:
+        changes += ["delete", task_id, 0, b""]
+    generation = await redis_client.eval(
+        PATCH_TASK_SET_SCRIPT,
+        2,
+        generation_key(username),
+        task_set_key(username),
+        *announcement_args(username, messages),
+        CACHE_TTL,
+        # Two fields per task plus "_gen"; tombstones make this conservative.
+        2 * FULL_SET_MAX_TASKS + 1,
+        *changes,
+    )
+    apply_generation(username, generation)
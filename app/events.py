@@ -0,0 +1,91 @@
+import asyncio
+import orjson
+import os
+from typing import AsyncIterator, Dict, List, Optional, Set, Tuple
+
+from app.cache import register_channel_handler
+from app.schemas import TaskRead
+
+# One channel for all users: every worker holds a single subscription (the
+# cache invalidation listener) and fans messages out to its own connections.
+TASK_EVENTS_CHANNEL = "tasks:events"
+EVENT_QUEUE_SIZE = int(os.getenv("EVENT_QUEUE_SIZE", "100"))
+SSE_KEEPALIVE = 15.0
+# Sent instead of events that were lost; clients refetch their task list.
+RESYNC_EVENT = orjson.dumps({"type": "resync"})
+
+subscribers: Dict[int, Set[asyncio.Queue]] = {}
+
+
+def subscribe(user_id: int) -> asyncio.Queue:
+    queue: asyncio.Queue = asyncio.Queue(maxsize=EVENT_QUEUE_SIZE)
+    subscribers.setdefault(user_id, set()).add(queue)
+    return queue
+
+
+def unsubscribe(user_id: int, queue: asyncio.Queue):
+    queues = subscribers.get(user_id)
+    if queues is None:
+        return
+    queues.discard(queue)
+    if not queues:
+        del subscribers[user_id]
+
+
+def deliver(queue: asyncio.Queue, payload: bytes):
+    try:
+        queue.put_nowait(payload)
+    except asyncio.QueueFull:
+        # A stalled client gets one resync marker instead of unbounded buffering.
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(RESYNC_EVENT)
+
+
+def handle_task_event(data: bytes):
+    """Forward a ``"<user_id>\\n<json>"`` message to that user's local streams."""
+    user_id, _, payload = data.partition(b"\n")
+    for queue in list(subscribers.get(int(user_id), ())):
+        deliver(queue, payload)
+
+
+def resync_all():
+    for queues in subscribers.values():
+        for queue in queues:
+            deliver(queue, RESYNC_EVENT)
+
+
+register_channel_handler(TASK_EVENTS_CHANNEL, handle_task_event, reset=resync_all)
+
+
+def task_event_message(
+    user_id: int,
+    event_type: str,
+    tasks: Optional[List[TaskRead]] = None,
+    deleted: Optional[List[int]] = None,
+) -> Tuple[str, bytes]:
+    """Channel and message of an event, e.g. for the cache to publish with a write."""
+    event = {"type": event_type}
+    if tasks is not None:
+        event["tasks"] = [task.model_dump() for task in tasks]
+    if deleted is not None:
+        event["deleted"] = deleted
+    payload = orjson.dumps(event, option=orjson.OPT_UTC_Z)
+    return TASK_EVENTS_CHANNEL, str(user_id).encode() + b"\n" + payload
+
+
+async def stream_task_events(user_id: int) -> AsyncIterator[bytes]:
+    """Server-sent events for ``user_id`` until the client disconnects."""
+    queue = subscribe(user_id)
+    try:
+        yield b"retry: 3000\n\n"
+        while True:
+            try:
+                payload = await asyncio.wait_for(queue.get(), SSE_KEEPALIVE)
+            except asyncio.TimeoutError:
+                # Comment lines keep proxies from closing an idle stream.
+                yield b": keepalive\n\n"
+                continue
+            yield b"data: " + payload + b"\n\n"
+    finally:
+        unsubscribe(user_id, queue)
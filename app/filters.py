@@ -0,0 +1,68 @@
+from datetime import datetime, timezone
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+
+from app.models import Task
+
+
+class TaskFilters(NamedTuple):
+    """Canonical form of the list filters: equal filters compare equal."""
+
+    statuses: Tuple[str, ...] = ()
+    priority_min: Optional[int] = None
+    priority_max: Optional[int] = None
+    created_after: Optional[datetime] = None
+    created_before: Optional[datetime] = None
+
+
+def to_naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    # created_at is stored as naive UTC.
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def make_task_filters(
+    statuses: Optional[Iterable[str]] = None,
+    priority_min: Optional[int] = None,
+    priority_max: Optional[int] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+) -> TaskFilters:
+    return TaskFilters(
+        tuple(sorted(set(statuses or ()))),
+        priority_min,
+        priority_max,
+        to_naive_utc(created_after),
+        to_naive_utc(created_before),
+    )
+
+
+def filter_clauses(filters: TaskFilters) -> List:
+    """Predicates served by the (owner_id, status|priority|created_at) indexes."""
+    clauses = []
+    if len(filters.statuses) == 1:
+        clauses.append(Task.status == filters.statuses[0])
+    elif filters.statuses:
+        clauses.append(Task.status.in_(filters.statuses))
+    if filters.priority_min is not None:
+        clauses.append(Task.priority >= filters.priority_min)
+    if filters.priority_max is not None:
+        clauses.append(Task.priority <= filters.priority_max)
+    if filters.created_after is not None:
+        clauses.append(Task.created_at >= filters.created_after)
+    if filters.created_before is not None:
+        clauses.append(Task.created_at < filters.created_before)
+    return clauses
+
+
+def filters_cache_fragment(filters: TaskFilters) -> str:
+    def bound(value) -> str:
+        if value is None:
+            return ""
+        return value.isoformat() if isinstance(value, datetime) else str(value)
+
+    return (
+        f"status={','.join(filters.statuses)}"
+        f":priority={bound(filters.priority_min)}..{bound(filters.priority_max)}"
+        f":created={bound(filters.created_after)}..{bound(filters.created_before)}"
+    )
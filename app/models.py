@@ -1,10 +1,30 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index
+from sqlalchemy import func, literal_column
+from sqlalchemy.dialects import postgresql  # noqa: F401 registers to_tsvector()
 from sqlalchemy.orm import declarative_base, relationship
 from datetime import datetime, timezone
 
 Base = declarative_base()
 
 
+def utcnow() -> datetime:
+    # Columns are TIMESTAMP WITHOUT TIME ZONE and asyncpg rejects aware values.
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+# Constants are inlined rather than bound so queries match the index expression.
+SEARCH_CONFIG = literal_column("'simple'::regconfig")
+
+
+def task_search_vector(title, description):
+    document = (
+        func.coalesce(title, literal_column("''"))
+        .concat(literal_column("' '"))
+        .concat(func.coalesce(description, literal_column("''")))
+    )
+    return func.to_tsvector(SEARCH_CONFIG, document)
+
+
 class User(Base):
     __tablename__ = "users"
     id = Column(Integer, primary_key=True, index=True)
@@ -18,7 +38,48 @@ class Task(Base):
     title = Column(String, index=True)
     description = Column(String)
     status = Column(String, default="в ожидании")
-    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    created_at = Column(DateTime, default=utcnow)
+    updated_at = Column(DateTime, default=utcnow, onupdate=utcnow)
+    version = Column(
+        Integer,
+        nullable=False,
+        default=1,
+        server_default="1",
+        onupdate=literal_column("version") + 1,
+    )
     priority = Column(Integer, default=0)
     owner_id = Column(Integer, ForeignKey("users.id"), nullable=True)
     owner = relationship("User")
+
+    # Fetches the bumped version with RETURNING, so committed rows carry it.
+    __mapper_args__ = {"eager_defaults": True}
+
+    # Every list query filters on owner_id and orders by one of these keys,
+    # with id as the keyset pagination tie-breaker.
+    __table_args__ = (
+        Index("ix_tasks_owner_id_id", owner_id, id),
+        Index("ix_tasks_owner_priority", owner_id, priority.desc(), id),
+        Index("ix_tasks_owner_created_at", owner_id, created_at, id),
+        Index("ix_tasks_owner_status", owner_id, status, id),
+        Index("ix_tasks_owner_title", owner_id, title, id),
+        Index("ix_tasks_owner_updated_at", owner_id, updated_at),
+        Index(
+            "ix_tasks_search_vector",
+            task_search_vector(title, description),
+            postgresql_using="gin",
+        ).ddl_if(dialect="postgresql"),
+    )
+
+
+class TaskDeletion(Base):
+    """Tombstone of a deleted task, read by the /tasks/changes delta sync."""
+
+    __tablename__ = "task_deletions"
+    id = Column(Integer, primary_key=True)
+    task_id = Column(Integer, nullable=False)
+    owner_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    deleted_at = Column(DateTime, default=utcnow, nullable=False)
+
+    __table_args__ = (
+        Index("ix_task_deletions_owner_deleted_at", owner_id, deleted_at),
+    )
@@ -0,0 +1,168 @@
+import base64
+import orjson
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from sqlalchemy import and_, or_
+
+from app.filters import to_naive_utc
+from app.models import Task
+
+MAX_PAGE_SIZE = 1000
+
+# Sort key -> whether it is ordered descending.
+SORT_COLUMNS = {
+    "title": False,
+    "status": False,
+    "created_at": False,
+    "priority": True,
+    "id": False,
+}
+
+Ordering = List[Tuple[str, bool]]
+# Types a decoded cursor may hold per column; created_at is an ISO string.
+CURSOR_VALUE_TYPES = {
+    "title": str,
+    "status": str,
+    "created_at": str,
+    "priority": int,
+    "id": int,
+    "rank": (int, float),
+}
+
+
+class CursorPosition(NamedTuple):
+    values: list
+    returned: int
+
+
+def get_ordering(
+    sort_by: Optional[str], top: Optional[int], ranked: bool = False
+) -> Ordering:
+    """Columns a task list is ordered by; always ends with ``id`` so it is total.
+
+    ``ranked`` orders an unsorted search by relevance, exposed as the "rank"
+    expression that callers pass to the other helpers.
+    """
+    if ranked and sort_by not in SORT_COLUMNS and top is None:
+        return [("rank", True), ("id", False)]
+    ordering = []
+    if sort_by in SORT_COLUMNS:
+        ordering.append((sort_by, SORT_COLUMNS[sort_by]))
+    if top is not None and sort_by != "priority":
+        ordering.append(("priority", True))
+    if sort_by != "id":
+        ordering.append(("id", False))
+    return ordering
+
+
+def get_page_size(
+    limit: Optional[int], top: Optional[int], returned: int
+) -> Optional[int]:
+    """Rows for the next page: ``limit``, capped by what is left of ``top``."""
+    if top is None:
+        return limit
+    remaining = max(top - returned, 0)
+    return remaining if limit is None else min(limit, remaining)
+
+
+def _expression(column: str, expressions: Optional[Dict[str, object]]):
+    if expressions and column in expressions:
+        return expressions[column]
+    return getattr(Task, column)
+
+
+def order_by_clauses(
+    ordering: Ordering, expressions: Optional[Dict[str, object]] = None
+) -> list:
+    clauses = []
+    for column, descending in ordering:
+        expression = _expression(column, expressions)
+        clauses.append(expression.desc() if descending else expression.asc())
+    return clauses
+
+
+def keyset_predicate(
+    ordering: Ordering, values: list, expressions: Optional[Dict[str, object]] = None
+):
+    """Rows strictly after ``values`` in ``ordering``."""
+    clauses = []
+    for i, (column, descending) in enumerate(ordering):
+        attr = _expression(column, expressions)
+        equal = [
+            _expression(previous, expressions) == value
+            for (previous, _), value in zip(ordering[:i], values[:i])
+        ]
+        after = attr < values[i] if descending else attr > values[i]
+        clauses.append(and_(*equal, after))
+    return or_(*clauses)
+
+
+def encode_cursor(
+    ordering: Ordering, task, returned: int, computed: Optional[dict] = None
+) -> str:
+    """``computed`` supplies values of expression columns such as "rank"."""
+    computed = computed or {}
+    payload = {
+        "o": [column for column, _ in ordering],
+        "k": [
+            computed[column] if column in computed else getattr(task, column)
+            for column, _ in ordering
+        ],
+        "n": returned,
+    }
+    return encode_cursor_payload(payload)
+
+
+def encode_cursor_payload(payload: dict) -> str:
+    return base64.urlsafe_b64encode(orjson.dumps(payload)).rstrip(b"=").decode()
+
+
+def decode_cursor_payload(cursor: str) -> dict:
+    """Raises ``ValueError`` unless ``cursor`` is a base64url JSON object."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = orjson.loads(base64.urlsafe_b64decode(padded))
+    except ValueError as e:  # Covers binascii.Error and orjson.JSONDecodeError.
+        raise ValueError("Malformed cursor") from e
+    if not isinstance(payload, dict):
+        raise ValueError("Malformed cursor")
+    return payload
+
+
+def cursor_datetime(value) -> datetime:
+    """Naive UTC datetime from a cursor's ISO string; ``ValueError`` otherwise."""
+    if not isinstance(value, str):
+        raise ValueError("Malformed cursor")
+    return to_naive_utc(datetime.fromisoformat(value))
+
+
+def decode_cursor(cursor: str, ordering: Ordering) -> CursorPosition:
+    """Raises ``ValueError`` for malformed cursors or ones issued for another sort."""
+    payload = decode_cursor_payload(cursor)
+    try:
+        columns, values, returned = payload["o"], payload["k"], payload["n"]
+    except KeyError as e:
+        raise ValueError("Malformed cursor") from e
+    if (
+        not isinstance(values, list)
+        or isinstance(returned, bool)
+        or not isinstance(returned, int)
+        or returned < 0
+    ):
+        raise ValueError("Malformed cursor")
+    if columns != [column for column, _ in ordering] or len(values) != len(columns):
+        raise ValueError("Cursor does not match the requested ordering")
+    return CursorPosition(
+        [_cursor_value(column, value) for column, value in zip(columns, values)],
+        returned,
+    )
+
+
+def _cursor_value(column: str, value):
+    """Check a cursor value against its column's type; ``ValueError`` if wrong."""
+    expected = CURSOR_VALUE_TYPES[column]
+    if isinstance(value, bool) or not isinstance(value, expected):
+        raise ValueError(f"Invalid cursor value for {column}")
+    if column == "created_at":
+        return cursor_datetime(value)
+    return value
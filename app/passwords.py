@@ -0,0 +1,68 @@
+from concurrent.futures import Executor, ProcessPoolExecutor
+from passlib.context import CryptContext
+from typing import Optional, Tuple
+import asyncio
+import multiprocessing
+import os
+
+# Kept free of app imports: worker processes import this module on spawn.
+
+PASSWORD_HASH_ROUNDS = int(os.getenv("PASSWORD_HASH_ROUNDS", "29000"))
+# 0 runs hashing on the default thread pool instead of separate processes.
+PASSWORD_HASH_WORKERS = int(
+    os.getenv("PASSWORD_HASH_WORKERS", str(min(os.cpu_count() or 1, 4)))
+)
+
+pwd_context = CryptContext(
+    schemes=["pbkdf2_sha256"],
+    deprecated="auto",
+    pbkdf2_sha256__rounds=PASSWORD_HASH_ROUNDS,
+)
+
+hash_executor: Optional[Executor] = None
+
+
+def verify_password(plain_password, hashed_password):
+    return pwd_context.verify(plain_password, hashed_password)
+
+
+def get_password_hash(password):
+    return pwd_context.hash(password)
+
+
+def verify_and_update_password(
+    plain_password, hashed_password
+) -> Tuple[bool, Optional[str]]:
+    """Also returns a fresh hash when the stored one uses outdated parameters."""
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
+def get_hash_executor() -> Optional[Executor]:
+    global hash_executor
+    if hash_executor is None and PASSWORD_HASH_WORKERS > 0:
+        hash_executor = ProcessPoolExecutor(
+            max_workers=PASSWORD_HASH_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return hash_executor
+
+
+def shutdown_hash_executor():
+    global hash_executor
+    if hash_executor is not None:
+        hash_executor.shutdown(cancel_futures=True)
+        hash_executor = None
+
+
+async def hash_password_async(password: str) -> str:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_hash_executor(), get_password_hash, password)
+
+
+async def verify_password_async(
+    plain_password: str, hashed_password: str
+) -> Tuple[bool, Optional[str]]:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        get_hash_executor(), verify_and_update_password, plain_password, hashed_password
+    )
@@ -0,0 +1,57 @@
+from fastapi import HTTPException, Request, status
+from secrets import token_hex
+from typing import List, Tuple
+import math
+import os
+import time
+
+from app import cache
+
+# Sliding-window limits for credential endpoints, per window of seconds.
+AUTH_RATE_WINDOW = float(os.getenv("AUTH_RATE_WINDOW", "60"))
+AUTH_RATE_LIMIT_PER_USERNAME = int(os.getenv("AUTH_RATE_LIMIT_PER_USERNAME", "10"))
+AUTH_RATE_LIMIT_PER_IP = int(os.getenv("AUTH_RATE_LIMIT_PER_IP", "100"))
+
+
+def rate_limit_key(scope: str, kind: str, value: str) -> str:
+    return f"ratelimit:{scope}:{kind}:{value}"
+
+
+async def hit_rate_limits(limits: List[Tuple[str, int]], window: float) -> float:
+    """Record one attempt under each ``(key, limit)``, in a single round trip.
+
+    Returns seconds to wait if any limit is exceeded, else 0. Attempts are kept
+    as members of a sorted set scored by time, so the window slides instead of
+    resetting on fixed boundaries.
+    """
+    now = time.time()
+    async with cache.redis_client.pipeline(transaction=True) as pipe:
+        for key, _ in limits:
+            pipe.zremrangebyscore(key, 0, now - window)
+            pipe.zadd(key, {f"{now}:{token_hex(4)}": now})
+            pipe.zcard(key)
+            pipe.zrange(key, 0, 0, withscores=True)
+            pipe.expire(key, math.ceil(window))
+        results = await pipe.execute()
+    retry_after = 0
+    for i, (_, limit) in enumerate(limits):
+        _, _, count, oldest, _ = results[5 * i : 5 * i + 5]
+        if count > limit:
+            retry_after = max(retry_after, oldest[0][1] + window - now, 0)
+    return retry_after
+
+
+async def check_auth_rate_limit(request: Request, scope: str, username: str):
+    """Raise 429 when ``username`` or the client address is over its limit."""
+    client_ip = request.client.host if request.client else "unknown"
+    limits = [
+        (rate_limit_key(scope, "user", username), AUTH_RATE_LIMIT_PER_USERNAME),
+        (rate_limit_key(scope, "ip", client_ip), AUTH_RATE_LIMIT_PER_IP),
+    ]
+    retry_after = await hit_rate_limits(limits, AUTH_RATE_WINDOW)
+    if retry_after:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many attempts, try again later",
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+        )
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, ConfigDict
-from typing import Optional
+from typing import Any, List, Optional
 from datetime import datetime, timezone
 
 
@@ -21,6 +21,36 @@ class TaskRead(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
 
+class TaskBulkUpdate(TaskCreate):
+    id: int
+
+
+class BulkItemError(BaseModel):
+    index: int
+    id: Optional[int] = None
+    detail: Any
+
+
+class BulkTaskResult(BaseModel):
+    tasks: List[TaskRead] = []
+    deleted: List[int] = []
+    errors: List[BulkItemError] = []
+
+
+class ImportResult(BaseModel):
+    imported: int
+    error_count: int
+    errors: List[BulkItemError] = []
+
+
+class TaskChanges(BaseModel):
+    changed: List[TaskRead] = []
+    deleted: List[int] = []
+    cursor: str
+    # ``changed`` is the complete task list and replaces the client's copy.
+    full: bool = False
+
+
 class UserCreate(BaseModel):
     username: str
     password: str
@@ -31,3 +61,12 @@ class UserRead(BaseModel):
     username: str
 
     model_config = ConfigDict(from_attributes=True)
+
+
+class Principal(BaseModel):
+    id: int
+    username: str
+
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
@@ -0,0 +1,48 @@
+import re
+from typing import List, Optional
+from sqlalchemy import and_, func, or_
+
+from app.models import SEARCH_CONFIG, Task, task_search_vector
+
+search_vector = task_search_vector(Task.title, Task.description)
+
+
+def search_terms(search: Optional[str]) -> List[str]:
+    """Split a search string into lowercase words, dropping tsquery syntax."""
+    return re.findall(r"\w+", search.lower()) if search else []
+
+
+def to_tsquery(terms: List[str]):
+    # Every word is a prefix match so search-as-you-type finds partial words.
+    return func.to_tsquery(SEARCH_CONFIG, " & ".join(f"{term}:*" for term in terms))
+
+
+def search_filter(terms: List[str], dialect: str):
+    """Tasks whose title or description contains every term.
+
+    On PostgreSQL this is answered from the GIN index on ``search_vector``;
+    other backends fall back to a case-insensitive LIKE per term.
+    """
+    if dialect == "postgresql":
+        return search_vector.op("@@")(to_tsquery(terms))
+    return and_(
+        *(
+            or_(Task.title.ilike(f"%{term}%"), Task.description.ilike(f"%{term}%"))
+            for term in terms
+        )
+    )
+
+
+def search_rank(terms: List[str]):
+    return func.ts_rank(search_vector, to_tsquery(terms))
+
+
+def matches_search(
+    title: Optional[str], description: Optional[str], terms: List[str], dialect: str
+) -> bool:
+    """In-memory counterpart of ``search_filter`` for cached task sets."""
+    document = f"{title or ''} {description or ''}".lower()
+    if dialect == "postgresql":
+        words = re.findall(r"\w+", document)
+        return all(any(word.startswith(term) for word in words) for term in terms)
+    return all(term in document for term in terms)
@@ -0,0 +1,23 @@
+import os
+from datetime import datetime, timedelta
+
+from app.pagination import cursor_datetime, decode_cursor_payload, encode_cursor_payload
+
+# Changes are re-sent for this long after a cursor was issued, so rows whose
+# transaction committed after the previous sync read are not missed. Clients
+# apply deltas idempotently by task id.
+SYNC_OVERLAP = timedelta(seconds=5)
+# Deletion tombstones are pruned after this long, so older cursors get a
+# full snapshot instead of a delta that would miss deletions.
+TASK_DELETION_RETENTION = timedelta(
+    days=float(os.getenv("TASK_DELETION_RETENTION_DAYS", "30"))
+)
+
+
+def encode_sync_cursor(synced_at: datetime) -> str:
+    return encode_cursor_payload({"t": synced_at.isoformat()})
+
+
+def decode_sync_cursor(cursor: str) -> datetime:
+    """Raises ``ValueError`` for malformed cursors; offsets are converted to UTC."""
+    return cursor_datetime(decode_cursor_payload(cursor).get("t"))
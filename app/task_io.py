@@ -0,0 +1,238 @@
+import csv
+import io
+import orjson
+from collections import deque
+from typing import AsyncIterator, Deque, Iterable, Iterator, List, Union
+from sqlalchemy import insert
+
+from app.models import Task
+
+EXPORT_BATCH_SIZE = 1000
+EXPORT_COLUMNS = [
+    Task.id,
+    Task.title,
+    Task.description,
+    Task.status,
+    Task.created_at,
+    Task.priority,
+]
+EXPORT_FIELDS = [column.key for column in EXPORT_COLUMNS]
+EXPORT_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def ndjson_chunk(rows: Iterable) -> bytes:
+    return b"".join(
+        orjson.dumps(
+            dict(row._mapping), option=orjson.OPT_UTC_Z | orjson.OPT_APPEND_NEWLINE
+        )
+        for row in rows
+    )
+
+
+def csv_chunk(rows: Iterable, header: bool = False) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(EXPORT_FIELDS)
+    for row in rows:
+        writer.writerow(
+            value.isoformat() if field == "created_at" and value else value
+            for field, value in zip(EXPORT_FIELDS, row)
+        )
+    return buffer.getvalue().encode()
+
+
+async def stream_export(result, export_format: str) -> AsyncIterator[bytes]:
+    """Encode a streamed result one ``yield_per`` partition at a time."""
+    if export_format == "csv":
+        yield csv_chunk([], header=True)
+    async for partition in result.partitions():
+        if export_format == "csv":
+            yield csv_chunk(partition)
+        else:
+            yield ndjson_chunk(partition)
+
+
+IMPORT_CHUNK_SIZE = 1000
+MAX_IMPORT_ERRORS = 1000
+MAX_IMPORT_LINE_SIZE = 1024 * 1024
+IMPORT_COLUMNS = [
+    "title",
+    "description",
+    "status",
+    "priority",
+    "owner_id",
+    "created_at",
+    "updated_at",
+    "version",
+]
+
+
+def line_too_long() -> ValueError:
+    return ValueError(f"Line longer than {MAX_IMPORT_LINE_SIZE} bytes")
+
+
+async def iter_lines(
+    chunks: AsyncIterator[bytes],
+) -> AsyncIterator[Union[bytes, ValueError]]:
+    """Split a byte stream into lines without reading the whole body.
+
+    A line longer than ``MAX_IMPORT_LINE_SIZE`` is replaced by a ``ValueError``
+    and dropped as it arrives instead of being buffered.
+    """
+    pending = b""
+    overlong = False
+    async for chunk in chunks:
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            if overlong:
+                # The end of a line already reported as too long.
+                overlong = False
+            elif len(line) > MAX_IMPORT_LINE_SIZE:
+                yield line_too_long()
+            else:
+                yield line
+        if len(pending) > MAX_IMPORT_LINE_SIZE:
+            if not overlong:
+                yield line_too_long()
+            overlong = True
+            pending = b""
+    if pending and not overlong:
+        yield pending
+
+
+async def iter_ndjson_items(chunks: AsyncIterator[bytes]) -> AsyncIterator[object]:
+    """Yield one parsed item per non-blank line, or the ``ValueError`` it raised."""
+    async for line in iter_lines(chunks):
+        if isinstance(line, ValueError):
+            yield line
+            continue
+        if not line.strip():
+            continue
+        try:
+            yield orjson.loads(line)
+        except orjson.JSONDecodeError as e:
+            yield ValueError(f"Invalid JSON: {e}")
+
+
+class CsvLineFeed:
+    """Decoded lines for one ``csv.reader``; runs dry instead of waiting.
+
+    ``read_records`` yields complete records only. The lines of a record whose
+    quoted field continues past the data received so far are put back and
+    parsed again once the buffer has doubled, so a stray quote costs linear
+    time up to ``MAX_IMPORT_LINE_SIZE``, where the record is reported instead.
+    """
+
+    def __init__(self):
+        self.lines: Deque[str] = deque()
+        self.buffered = 0
+        self.retry_at = 0
+        self.record: List[str] = []
+        self.ran_dry = False
+        self.reader = csv.reader(self)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> str:
+        if not self.lines:
+            self.ran_dry = True
+            raise StopIteration
+        line = self.lines.popleft()
+        self.buffered -= len(line)
+        self.record.append(line)
+        return line
+
+    def push(self, line: str):
+        self.lines.append(line)
+        self.buffered += len(line)
+
+    def read_records(self) -> Iterator[Union[List[str], ValueError]]:
+        if self.buffered < self.retry_at:
+            return
+        self.retry_at = 0
+        while True:
+            self.record = []
+            self.ran_dry = False
+            try:
+                values = next(self.reader)
+            except StopIteration:
+                values = None
+            except csv.Error as e:
+                values = ValueError(f"Invalid CSV: {e}")
+            if self.ran_dry:
+                if self.record:
+                    self.lines.extendleft(reversed(self.record))
+                    self.buffered += sum(map(len, self.record))
+                    self.retry_at = self.buffered * 2
+                if self.buffered > MAX_IMPORT_LINE_SIZE:
+                    self.lines.clear()
+                    self.buffered = self.retry_at = 0
+                    yield ValueError(
+                        f"Record longer than {MAX_IMPORT_LINE_SIZE} characters"
+                    )
+                return
+            yield values
+
+
+async def iter_csv_items(chunks: AsyncIterator[bytes]) -> AsyncIterator[object]:
+    """Yield one dict per CSV record keyed by the header row.
+
+    Records are parsed by ``csv.reader`` as the body arrives, so quoted fields
+    may span lines. Empty cells are left out so model defaults apply.
+    """
+    feed = CsvLineFeed()
+    header = None
+    first_line = True
+
+    def parse_records() -> Iterator[object]:
+        nonlocal header
+        for values in feed.read_records():
+            if isinstance(values, ValueError):
+                yield values
+            elif not "".join(values).strip():
+                continue
+            elif header is None:
+                header = values
+            else:
+                yield {
+                    field: value for field, value in zip(header, values) if value != ""
+                }
+
+    async for line in iter_lines(chunks):
+        if not isinstance(line, ValueError):
+            try:
+                line = line.decode("utf-8-sig" if first_line else "utf-8")
+            except UnicodeDecodeError as e:
+                line = ValueError(f"Invalid UTF-8: {e}")
+        first_line = False
+        if isinstance(line, ValueError):
+            yield line
+            continue
+        feed.push(line + "\n")
+        for item in parse_records():
+            yield item
+    feed.retry_at = 0
+    for item in parse_records():
+        yield item
+    if feed.lines:
+        yield ValueError("Unterminated quoted field")
+
+
+async def copy_tasks(db, rows: list):
+    """Load validated rows with COPY on PostgreSQL, executemany elsewhere."""
+    if db.get_bind().dialect.name == "postgresql":
+        connection = await db.connection()
+        # The asyncpg adapter begins its transaction lazily on the first
+        # statement it runs; COPY bypasses it and would autocommit each chunk.
+        await connection.exec_driver_sql("SELECT 1")
+        raw_connection = await connection.get_raw_connection()
+        await raw_connection.driver_connection.copy_records_to_table(
+            Task.__tablename__,
+            records=[tuple(row[column] for column in IMPORT_COLUMNS) for row in rows],
+            columns=IMPORT_COLUMNS,
+        )
+    else:
+        await db.execute(insert(Task), rows)
@@ -0,0 +1,95 @@
+"""List views derived in memory from a user's cached task set.
+
+They follow the SQL built in ``read_tasks`` for the same parameters, except
+that strings compare by code point rather than by database collation.
+"""
+from typing import List, Optional
+
+from app.cache import CachedPage, CachedTask, page_etag
+from app.filters import TaskFilters, to_naive_utc
+from app.pagination import Ordering, decode_cursor, encode_cursor, get_page_size
+from app.search import matches_search
+
+
+def matches_filters(task, filters: TaskFilters) -> bool:
+    if filters.statuses and task.status not in filters.statuses:
+        return False
+    if filters.priority_min is not None and task.priority < filters.priority_min:
+        return False
+    if filters.priority_max is not None and task.priority > filters.priority_max:
+        return False
+    created_at = to_naive_utc(task.created_at)
+    if filters.created_after is not None and created_at < filters.created_after:
+        return False
+    if filters.created_before is not None and created_at >= filters.created_before:
+        return False
+    return True
+
+
+def sort_entries(entries: List[CachedTask], ordering: Ordering) -> List[CachedTask]:
+    # Stable sorts applied from the last key to the first. NULLs sort last
+    # ascending and first descending, as in PostgreSQL.
+    entries = list(entries)
+    for column, descending in reversed(ordering):
+        entries.sort(
+            key=lambda entry: (
+                (value := getattr(entry.task, column)) is None,
+                value if value is not None else 0,
+            ),
+            reverse=descending,
+        )
+    return entries
+
+
+def is_after(task, ordering: Ordering, values: list) -> bool:
+    """Whether ``task`` comes strictly after the keyset position ``values``."""
+    for (column, descending), value in zip(ordering, values):
+        current = getattr(task, column)
+        if current == value:
+            continue
+        return current < value if descending else current > value
+    return False
+
+
+def derive_task_page(
+    entries: List[CachedTask],
+    ordering: Ordering,
+    terms: List[str],
+    dialect: str,
+    top: Optional[int],
+    limit: Optional[int],
+    cursor: Optional[str],
+    filters: TaskFilters,
+) -> CachedPage:
+    """Raises ``ValueError`` for an invalid cursor, like ``decode_cursor``."""
+    position = decode_cursor(cursor, ordering) if cursor else None
+    returned = position.returned if position else 0
+    page_size = get_page_size(limit, top, returned)
+
+    selected = [
+        entry
+        for entry in entries
+        if matches_filters(entry.task, filters)
+        and (
+            not terms
+            or matches_search(entry.task.title, entry.task.description, terms, dialect)
+        )
+    ]
+    selected = sort_entries(selected, ordering)
+    if position:
+        selected = [
+            entry
+            for entry in selected
+            if is_after(entry.task, ordering, position.values)
+        ]
+
+    next_cursor = None
+    if page_size is not None and len(selected) > page_size:
+        selected = selected[:page_size]
+        if top is None or returned + page_size < top:
+            next_cursor = encode_cursor(
+                ordering, selected[-1].task, returned + page_size
+            )
+
+    body = b"[" + b",".join(entry.raw for entry in selected) + b"]"
+    return CachedPage(body, next_cursor, page_etag(body, next_cursor))
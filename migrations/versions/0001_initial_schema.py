@@ -0,0 +1,50 @@
+"""initial schema
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+
+Databases created earlier through Base.metadata.create_all already have
+these tables, so they are only created when missing.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table("users"):
+        op.create_table(
+            "users",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("username", sa.String()),
+            sa.Column("password_hash", sa.String()),
+        )
+        op.create_index("ix_users_id", "users", ["id"])
+        op.create_index("ix_users_username", "users", ["username"], unique=True)
+    if not inspector.has_table("tasks"):
+        op.create_table(
+            "tasks",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("title", sa.String()),
+            sa.Column("description", sa.String()),
+            sa.Column("status", sa.String()),
+            sa.Column("created_at", sa.DateTime()),
+            sa.Column("priority", sa.Integer()),
+            sa.Column(
+                "owner_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=True
+            ),
+        )
+        op.create_index("ix_tasks_id", "tasks", ["id"])
+        op.create_index("ix_tasks_title", "tasks", ["title"])
+
+
+def downgrade():
+    op.drop_table("tasks")
+    op.drop_table("users")
@@ -0,0 +1,36 @@
+"""full-text search index on tasks
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+SEARCH_VECTOR = (
+    "to_tsvector('simple'::regconfig, "
+    "coalesce(title, '') || ' ' || coalesce(description, ''))"
+)
+
+
+def upgrade():
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    # CONCURRENTLY cannot run inside a transaction.
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_tasks_search_vector "
+            f"ON tasks USING gin ({SEARCH_VECTOR})"
+        )
+
+
+def downgrade():
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_tasks_search_vector")
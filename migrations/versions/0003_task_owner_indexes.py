@@ -0,0 +1,43 @@
+"""composite indexes for per-owner task listing
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+INDEXES = {
+    "ix_tasks_owner_id_id": ["owner_id", "id"],
+    "ix_tasks_owner_priority": ["owner_id", sa.text("priority DESC"), "id"],
+    "ix_tasks_owner_created_at": ["owner_id", "created_at", "id"],
+    "ix_tasks_owner_status": ["owner_id", "status", "id"],
+    "ix_tasks_owner_title": ["owner_id", "title", "id"],
+}
+
+
+def upgrade():
+    # Built CONCURRENTLY on PostgreSQL so a live tasks table stays writable.
+    with op.get_context().autocommit_block():
+        for name, columns in INDEXES.items():
+            op.create_index(
+                name,
+                "tasks",
+                columns,
+                if_not_exists=True,
+                postgresql_concurrently=True,
+            )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name in INDEXES:
+            op.drop_index(
+                name, table_name="tasks", if_exists=True, postgresql_concurrently=True
+            )
@@ -0,0 +1,88 @@
+"""updated_at/version columns and deletion log for delta sync
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+BACKFILL_BATCH_SIZE = 1000
+
+
+def backfill_updated_at():
+    """Fill updated_at in short autocommitted batches.
+
+    A single UPDATE would lock every task row and block writes until the
+    migration ends. Rows inserted meanwhile by the old code are picked up by
+    later batches.
+    """
+    bind = op.get_bind()
+    while True:
+        result = bind.execute(
+            sa.text(
+                "UPDATE tasks SET updated_at = COALESCE(created_at, CURRENT_TIMESTAMP)"
+                " WHERE id IN (SELECT id FROM tasks WHERE updated_at IS NULL"
+                " LIMIT :batch_size)"
+            ),
+            {"batch_size": BACKFILL_BATCH_SIZE},
+        )
+        if result.rowcount < BACKFILL_BATCH_SIZE:
+            break
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    columns = {column["name"] for column in inspector.get_columns("tasks")}
+    if "updated_at" not in columns:
+        op.add_column("tasks", sa.Column("updated_at", sa.DateTime()))
+    if "version" not in columns:
+        op.add_column(
+            "tasks",
+            sa.Column("version", sa.Integer(), nullable=False, server_default="1"),
+        )
+    if not inspector.has_table("task_deletions"):
+        op.create_table(
+            "task_deletions",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("task_id", sa.Integer(), nullable=False),
+            sa.Column(
+                "owner_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=True
+            ),
+            sa.Column("deleted_at", sa.DateTime(), nullable=False),
+        )
+        op.create_index(
+            "ix_task_deletions_owner_deleted_at",
+            "task_deletions",
+            ["owner_id", "deleted_at"],
+        )
+    with op.get_context().autocommit_block():
+        backfill_updated_at()
+        op.create_index(
+            "ix_tasks_owner_updated_at",
+            "tasks",
+            ["owner_id", "updated_at"],
+            if_not_exists=True,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_tasks_owner_updated_at",
+            table_name="tasks",
+            if_exists=True,
+            postgresql_concurrently=True,
+        )
+    op.drop_table("task_deletions")
+    with op.batch_alter_table("tasks") as batch_op:
+        batch_op.drop_column("version")
+        batch_op.drop_column("updated_at")
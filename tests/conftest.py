@@ -2,10 +2,12 @@ import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
 from typing import Generator
 import sys
 import os
-from unittest.mock import MagicMock
+import fakeredis
 
 TEST_POSTGRESQL_URL = os.getenv("DATABASE_URL")
 
@@ -13,8 +15,16 @@ project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 sys.path.insert(0, project_root)
 
 from app.app import app, get_db
+from app.database import make_async_url
+from app.cache import clear_local_cache
 from app.models import Base, User
-from app.auth import get_password_hash, create_access_token
+from app.auth import (
+    create_access_token,
+    get_password_hash,
+    revoked_tokens,
+    token_cache,
+    user_id_cache,
+)
 from datetime import timedelta
 
 SQLALCHEMY_DATABASE_URL_TEST = TEST_POSTGRESQL_URL
@@ -22,6 +32,13 @@ SQLALCHEMY_DATABASE_URL_TEST = TEST_POSTGRESQL_URL
 engine_test = create_engine(SQLALCHEMY_DATABASE_URL_TEST)
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine_test)
 
+async_engine_test = create_async_engine(
+    make_async_url(SQLALCHEMY_DATABASE_URL_TEST), poolclass=NullPool
+)
+TestingAsyncSessionLocal = async_sessionmaker(
+    bind=async_engine_test, autoflush=False, expire_on_commit=False
+)
+
 Base.metadata.create_all(bind=engine_test)
 
 @pytest.fixture(scope="function")
@@ -34,12 +51,9 @@ def db_session() -> Generator[sessionmaker, None, None]:
         db.close()
         Base.metadata.drop_all(bind=engine_test)
 
-def override_get_db():
-    db = TestingSessionLocal()
-    try:
+async def override_get_db():
+    async with TestingAsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 app.dependency_overrides[get_db] = override_get_db
 
@@ -61,9 +75,11 @@ def test_user(db_session):
     return user_data
 
 @pytest.fixture(scope="function")
-def auth_token(test_user):
+def auth_token(test_user, db_session):
+    user = db_session.query(User).filter(User.username == test_user["username"]).first()
     access_token = create_access_token(
-        data={"sub": test_user["username"]}, expires_delta=timedelta(minutes=30)
+        data={"sub": user.username, "uid": user.id},
+        expires_delta=timedelta(minutes=30),
     )
     return access_token
 
@@ -71,12 +87,37 @@ def auth_token(test_user):
 def auth_headers(auth_token):
     return {"Authorization": f"Bearer {auth_token}"}
 
+fake_redis_server = fakeredis.FakeServer()
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
 @pytest.fixture(autouse=True, scope="session")
 def mock_redis_globally(session_mocker):
-    mock_client = MagicMock()
-    mock_client.get.return_value = None
-    mock_client.setex.return_value = True
-    mock_client.delete.return_value = 1
-    mock_client.keys.return_value = []
-    session_mocker.patch("app.cache.redis_client", new=mock_client)
-    return mock_client
\ No newline at end of file
+    fake_client = fakeredis.FakeAsyncRedis(server=fake_redis_server)
+    session_mocker.patch("app.cache.redis_client", new=fake_client)
+    session_mocker.patch("app.app.init_redis")
+    session_mocker.patch("app.app.close_redis")
+    return fake_client
+
+
+@pytest.fixture
+def fake_redis():
+    """Synchronous client of the fake Redis server the app uses."""
+    return fakeredis.FakeRedis(server=fake_redis_server)
+
+
+@pytest.fixture(autouse=True)
+def flush_fake_redis():
+    fakeredis.FakeRedis(server=fake_redis_server).flushall()
+    clear_local_cache()
+
+
+@pytest.fixture(autouse=True)
+def clear_user_id_cache():
+    user_id_cache.clear()
+    token_cache.clear()
+    revoked_tokens.clear()
@@ -1,9 +1,19 @@
 from fastapi.testclient import TestClient
+from app.app import app, get_db, read_task_changes
+from app.cache import local_task_sets
+from sqlalchemy.dialects.sqlite.aiosqlite import SQLiteDialect_aiosqlite
 from sqlalchemy.orm import Session
-from app.models import Task, User
+from app.models import Task, TaskDeletion, User, utcnow
 from app.schemas import TaskRead
+from app.sync import SYNC_OVERLAP, TASK_DELETION_RETENTION, encode_sync_cursor
+from app.task_io import copy_tasks
+import base64
+import csv
+import io
 import json
 from datetime import timedelta
+from types import SimpleNamespace
+from unittest.mock import patch
 
 
 def create_task_direct(
@@ -85,6 +95,31 @@ def test_read_tasks_with_data(
     assert "Task Beta" in titles
 
 
+def test_read_tasks_cache_invalidated_after_create(
+    client: TestClient, auth_headers: dict
+):
+    client.post("/tasks", headers=auth_headers, json={"title": "Cached Task"})
+    first = client.get("/tasks", headers=auth_headers)
+    assert [task["title"] for task in first.json()] == ["Cached Task"]
+
+    client.post("/tasks", headers=auth_headers, json={"title": "Fresh Task"})
+    second = client.get("/tasks", headers=auth_headers)
+    assert {task["title"] for task in second.json()} == {"Cached Task", "Fresh Task"}
+
+
+def test_read_tasks_cache_hit_returns_same_body(
+    client: TestClient, auth_headers: dict
+):
+    client.post("/tasks", headers=auth_headers, json={"title": "Body Task"})
+    first = client.get("/tasks?sort_by=title", headers=auth_headers)
+    second = client.get("/tasks?sort_by=title", headers=auth_headers)
+
+    assert second.status_code == 200
+    assert second.headers["content-type"] == "application/json"
+    assert second.content == first.content
+    assert second.json()[0]["title"] == "Body Task"
+
+
 def test_read_tasks_sorting(
     client: TestClient, auth_headers: dict, db_session: Session, test_user
 ):
@@ -291,3 +326,754 @@ def test_delete_task_forbidden(
 
     response = client.delete(f"/tasks/{other_task_id}", headers=auth_headers)
     assert response.status_code == 403
+
+
+def _fetch_all_pages(client: TestClient, headers: dict, params: dict):
+    pages = []
+    params = dict(params)
+    while True:
+        response = client.get("/tasks", headers=headers, params=params)
+        assert response.status_code == 200
+        pages.append(response.json())
+        next_cursor = response.headers.get("X-Next-Cursor")
+        if not next_cursor:
+            return pages
+        params["cursor"] = next_cursor
+
+
+def test_read_tasks_cursor_pagination(
+    client: TestClient, auth_headers: dict, db_session: Session, test_user
+):
+    user = db_session.query(User).filter(User.username == test_user["username"]).first()
+    for title, priority in [("E", 1), ("B", 3), ("D", 3), ("A", 2), ("C", 5)]:
+        create_task_direct(db_session, user.id, title, priority=priority)
+
+    pages = _fetch_all_pages(client, auth_headers, {"sort_by": "title", "limit": 2})
+    assert [[t["title"] for t in page] for page in pages] == [
+        ["A", "B"],
+        ["C", "D"],
+        ["E"],
+    ]
+
+    pages = _fetch_all_pages(client, auth_headers, {"sort_by": "priority", "limit": 2})
+    titles = [t["title"] for page in pages for t in page]
+    assert titles == ["C", "B", "D", "A", "E"]
+
+    pages = _fetch_all_pages(client, auth_headers, {"limit": 3})
+    assert [len(page) for page in pages] == [3, 2]
+    ids = [t["id"] for page in pages for t in page]
+    assert ids == sorted(ids)
+
+
+def test_read_tasks_cursor_pagination_respects_top(
+    client: TestClient, auth_headers: dict, db_session: Session, test_user
+):
+    user = db_session.query(User).filter(User.username == test_user["username"]).first()
+    for priority in range(1, 6):
+        create_task_direct(db_session, user.id, f"P{priority}", priority=priority)
+
+    pages = _fetch_all_pages(client, auth_headers, {"top": 3, "limit": 2})
+    assert [[t["title"] for t in page] for page in pages] == [["P5", "P4"], ["P3"]]
+
+
+def test_read_tasks_invalid_cursor(client: TestClient, auth_headers: dict):
+    response = client.get(
+        "/tasks", headers=auth_headers, params={"limit": 2, "cursor": "not-a-cursor"}
+    )
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid cursor"
+
+
+def crafted_cursor(payload: dict) -> str:
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+
+def test_read_tasks_cursor_with_wrong_value_types_rejected(
+    client: TestClient, auth_headers: dict, db_session: Session, test_user, monkeypatch
+):
+    user = db_session.query(User).filter(User.username == test_user["username"]).first()
+    create_task_direct(db_session, user.id, "Only")
+    cursors = [
+        ("created_at", {"o": ["created_at", "id"], "k": [5, 2], "n": 1}),
+        ("title", {"o": ["title", "id"], "k": [1, 2], "n": 1}),
+        (None, {"o": ["id"], "k": [None], "n": 1}),
+        (None, {"o": ["id"], "k": [1], "n": -1}),
+        (None, {"o": ["id"], "k": 1, "n": 1}),
+    ]
+
+    for full_set_max in (1000, 0):
+        monkeypatch.setattr("app.app.FULL_SET_MAX_TASKS", full_set_max)
+        for sort_by, payload in cursors:
+            response = client.get(
+                "/tasks",
+                headers=auth_headers,
+                params={
+                    "sort_by": sort_by,
+                    "limit": 1,
+                    "cursor": crafted_cursor(payload),
+                },
+            )
+            assert response.status_code == 400, payload
+
+        # Times with an offset are compared as naive UTC, like stored ones.
+        aware = {"o": ["created_at", "id"], "k": ["2026-01-01T00:00:00+00:00", 1]}
+        response = client.get(
+            "/tasks",
+            headers=auth_headers,
+            params={
+                "sort_by": "created_at",
+                "limit": 1,
+                "cursor": crafted_cursor({**aware, "n": 1}),
+            },
+        )
+        assert response.status_code == 200
+
+
+def test_read_tasks_cursor_from_other_sort_rejected(
+    client: TestClient, auth_headers: dict, db_session: Session, test_user
+):
+    user = db_session.query(User).filter(User.username == test_user["username"]).first()
+    for title in ["A", "B", "C"]:
+        create_task_direct(db_session, user.id, title)
+
+    first = client.get("/tasks", headers=auth_headers, params={"limit": 1})
+    cursor = first.headers["X-Next-Cursor"]
+    response = client.get(
+        "/tasks",
+        headers=auth_headers,
+        params={"sort_by": "title", "limit": 1, "cursor": cursor},
+    )
+    assert response.status_code == 400
+
+
+def test_read_tasks_search_matches_all_words_case_insensitively(
+    client: TestClient, auth_headers: dict, db_session: Session, test_user
+):
+    user = db_session.query(User).filter(User.username == test_user["username"]).first()
+    create_task_direct(db_session, user.id, "Deploy Backend release")
+    create_task_direct(db_session, user.id, "Backend refactoring")
+    create_task_direct(db_session, user.id, "Frontend release")
+
+    response = client.get("/tasks?search=backend RELEASE", headers=auth_headers)
+    assert [task["title"] for task in response.json()] == ["Deploy Backend release"]
+
+    response = client.get("/tasks?search=backe", headers=auth_headers)
+    assert len(response.json()) == 2
+
+
+def test_read_tasks_filters(
+    client: TestClient, auth_headers: dict, db_session: Session, test_user, monkeypatch
+):
+    # Exercise the per-query page cache; derived views are compared separately.
+    monkeypatch.setattr("app.app.FULL_SET_MAX_TASKS", 0)
+    user = db_session.query(User).filter(User.username == test_user["username"]).first()
+    create_task_direct(db_session, user.id, "Todo low", priority=1)
+    create_task_direct(db_session, user.id, "Doing mid", priority=5, status="в работе")
+    create_task_direct(db_session, user.id, "Done high", priority=9, status="завершено")
+    old = create_task_direct(db_session, user.id, "Todo old", priority=5)
+    old.created_at = old.created_at - timedelta(days=10)
+    db_session.commit()
+
+    def titles(query: str) -> list:
+        response = client.get(f"/tasks?sort_by=title&{query}", headers=auth_headers)
+        assert response.status_code == 200
+        return [task["title"] for task in response.json()]
+
+    assert titles("status=в работе&status=завершено") == ["Doing mid", "Done high"]
+    assert titles("priority_min=2&priority_max=5") == ["Doing mid", "Todo old"]
+    cutoff = (old.created_at + timedelta(days=1)).isoformat() + "Z"
+    assert titles(f"created_before={cutoff}") == ["Todo old"]
+    assert titles(f"created_after={cutoff}&status=в ожидании") == ["Todo low"]
+    # Same filters in another order share one cache entry.
+    hits_before = client.get("/metrics/cache").json()["l1_hits"]
+    titles("status=завершено&status=в работе")
+    assert client.get("/metrics/cache").json()["l1_hits"] == hits_before + 1
+
+
+def test_create_tasks_bulk(
+    client: TestClient, auth_headers: dict, db_session: Session, test_user
+):
+    user = db_session.query(User).filter(User.username == test_user["username"]).first()
+    client.get("/tasks", headers=auth_headers)
+
+    items = [
+        {"title": "Bulk 1", "priority": 2},
+        {"description": "missing title"},
+        {"title": "Bulk 3", "status": "в работе"},
+    ]
+    response = client.post("/tasks/bulk", headers=auth_headers, json=items)
+
+    assert response.status_code == 200
+    data = response.json()
+    assert [task["title"] for task in data["tasks"]] == ["Bulk 1", "Bulk 3"]
+    assert [error["index"] for error in data["errors"]] == [1]
+    assert data["errors"][0]["detail"][0]["loc"] == ["title"]
+
+    owned = db_session.query(Task).filter(Task.owner_id == user.id).count()
+    assert owned == 2
+    listed = client.get("/tasks", headers=auth_headers).json()
+    assert {task["title"] for task in listed} == {"Bulk 1", "Bulk 3"}
+
+
+def test_update_tasks_bulk(
+    client: TestClient, auth_headers: dict, db_session: Session, test_user
+):
+    user = db_session.query(User).filter(User.username == test_user["username"]).first()
+    other = User(username="bulk_other", password_hash="x")
+    db_session.add(other)
+    db_session.commit()
+    own_task = create_task_direct(db_session, user.id, "Mine")
+    other_task = create_task_direct(db_session, other.id, "Theirs")
+
+    items = [
+        {"id": own_task.id, "title": "Mine updated", "priority": 7},
+        {"id": other_task.id, "title": "Hijacked"},
+        {"id": 99999, "title": "Ghost"},
+        {"id": own_task.id},
+    ]
+    response = client.patch("/tasks/bulk", headers=auth_headers, json=items)
+
+    assert response.status_code == 200
+    data = response.json()
+    assert [task["title"] for task in data["tasks"]] == ["Mine updated"]
+    assert data["tasks"][0]["priority"] == 7
+    assert [(e["index"], e["id"]) for e in data["errors"]] == [
+        (1, other_task.id),
+        (2, 99999),
+        (3, own_task.id),
+    ]
+    assert data["errors"][0]["detail"] == "Forbidden"
+    assert data["errors"][1]["detail"] == "Task not found"
+
+    db_session.expire_all()
+    assert db_session.get(Task, other_task.id).title == "Theirs"
+    assert db_session.get(Task, own_task.id).title == "Mine updated"
+
+
+def test_delete_tasks_bulk(
+    client: TestClient, auth_headers: dict, db_session: Session, test_user
+):
+    user = db_session.query(User).filter(User.username == test_user["username"]).first()
+    other = User(username="bulk_deleter_other", password_hash="x")
+    db_session.add(other)
+    db_session.commit()
+    first = create_task_direct(db_session, user.id, "First")
+    second = create_task_direct(db_session, user.id, "Second")
+    keep = create_task_direct(db_session, user.id, "Keep")
+    other_task = create_task_direct(db_session, other.id, "Theirs")
+
+    response = client.request(
+        "DELETE",
+        "/tasks/bulk",
+        headers=auth_headers,
+        json=[first.id, second.id, other_task.id],
+    )
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["deleted"] == [first.id, second.id]
+    assert [(e["index"], e["detail"]) for e in data["errors"]] == [(2, "Forbidden")]
+    remaining = client.get("/tasks", headers=auth_headers).json()
+    assert [task["id"] for task in remaining] == [keep.id]
+    db_session.expire_all()
+    assert db_session.get(Task, other_task.id) is not None
+
+
+def test_bulk_reports_non_object_items_per_index(
+    client: TestClient, auth_headers: dict, db_session: Session, test_user
+):
+    user = db_session.query(User).filter(User.username == test_user["username"]).first()
+    task = create_task_direct(db_session, user.id, "Existing")
+
+    created = client.post(
+        "/tasks/bulk", headers=auth_headers, json=[1, "a", {"title": "Fine"}]
+    )
+    updated = client.patch(
+        "/tasks/bulk",
+        headers=auth_headers,
+        json=[None, {"id": "x"}, {"id": task.id, "title": "Renamed"}],
+    )
+
+    assert created.status_code == 200
+    assert [t["title"] for t in created.json()["tasks"]] == ["Fine"]
+    assert [(e["index"], e["id"]) for e in created.json()["errors"]] == [
+        (0, None),
+        (1, None),
+    ]
+    assert updated.status_code == 200
+    assert [t["title"] for t in updated.json()["tasks"]] == ["Renamed"]
+    assert [(e["index"], e["id"]) for e in updated.json()["errors"]] == [
+        (0, None),
+        (1, None),
+    ]
+
+
+def test_bulk_delete_tombstones_keep_task_owner(
+    client: TestClient, auth_headers: dict, db_session: Session, test_user
+):
+    unowned_id = create_task_direct(db_session, None, "Unowned").id
+
+    client.request("DELETE", "/tasks/bulk", headers=auth_headers, json=[unowned_id])
+
+    tombstone = db_session.query(TaskDeletion).filter_by(task_id=unowned_id).one()
+    assert tombstone.owner_id is None
+
+
+def test_export_tasks_ndjson(
+    client: TestClient, auth_headers: dict, db_session: Session, test_user
+):
+    user = db_session.query(User).filter(User.username == test_user["username"]).first()
+    create_task_direct(db_session, user.id, "Export A", priority=1)
+    create_task_direct(db_session, user.id, "Export B", priority=2)
+    other = User(username="export_other", password_hash="x")
+    db_session.add(other)
+    db_session.commit()
+    create_task_direct(db_session, other.id, "Not mine")
+
+    response = client.get("/tasks/export", headers=auth_headers)
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = response.content.splitlines()
+    exported = [json.loads(line) for line in lines]
+    assert [task["title"] for task in exported] == ["Export A", "Export B"]
+    listed = client.get("/tasks", headers=auth_headers).json()
+    assert exported == listed
+
+
+def test_export_tasks_csv(
+    client: TestClient, auth_headers: dict, db_session: Session, test_user
+):
+    user = db_session.query(User).filter(User.username == test_user["username"]).first()
+    create_task_direct(db_session, user.id, "Export, with comma", priority=4)
+
+    response = client.get("/tasks/export?format=csv", headers=auth_headers)
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    rows = list(csv.reader(io.StringIO(response.text)))
+    assert rows[0] == ["id", "title", "description", "status", "created_at", "priority"]
+    assert rows[1][1] == "Export, with comma"
+    assert rows[1][5] == "4"
+    assert len(rows) == 2
+
+
+def test_export_tasks_rejects_unknown_format(client: TestClient, auth_headers: dict):
+    response = client.get("/tasks/export?format=xml", headers=auth_headers)
+    assert response.status_code == 422
+
+
+def test_import_tasks_ndjson_reports_bad_rows(client: TestClient, auth_headers: dict):
+    body = b"\n".join(
+        [
+            b'{"title": "Imported A", "priority": 3}',
+            b"{not json",
+            b'{"description": "no title"}',
+            b"",
+            b'{"title": "Imported B"}',
+        ]
+    )
+
+    response = client.post("/tasks/import", content=body, headers=auth_headers)
+
+    assert response.status_code == 200
+    result = response.json()
+    assert result["imported"] == 2
+    assert result["error_count"] == 2
+    assert [error["index"] for error in result["errors"]] == [1, 2]
+    tasks = client.get("/tasks?sort_by=title", headers=auth_headers).json()
+    assert [(task["title"], task["priority"]) for task in tasks] == [
+        ("Imported A", 3),
+        ("Imported B", 0),
+    ]
+
+
+def test_import_tasks_csv_roundtrip(
+    client: TestClient, auth_headers: dict, db_session: Session, test_user
+):
+    user = db_session.query(User).filter(User.username == test_user["username"]).first()
+    create_task_direct(db_session, user.id, "Line one\nline two, quoted", priority=2)
+    exported = client.get("/tasks/export?format=csv", headers=auth_headers).content
+
+    response = client.post(
+        "/tasks/import",
+        content=exported,
+        headers={**auth_headers, "Content-Type": "text/csv"},
+    )
+
+    assert response.status_code == 200
+    assert response.json() == {"imported": 1, "error_count": 0, "errors": []}
+    tasks = client.get("/tasks", headers=auth_headers).json()
+    assert [task["title"] for task in tasks] == ["Line one\nline two, quoted"] * 2
+    assert all(task["priority"] == 2 for task in tasks)
+
+
+def test_import_tasks_csv_quote_inside_unquoted_field(
+    client: TestClient, auth_headers: dict
+):
+    body = b'title,priority\nBuy 27" monitor,1\nSecond,2\nThird,3\n'
+
+    response = client.post(
+        "/tasks/import?format=csv", content=body, headers=auth_headers
+    )
+
+    assert response.json() == {"imported": 3, "error_count": 0, "errors": []}
+    tasks = client.get("/tasks?sort_by=title", headers=auth_headers).json()
+    assert [task["title"] for task in tasks] == ['Buy 27" monitor', "Second", "Third"]
+
+
+def test_import_tasks_rejects_overlong_lines_per_row(
+    client: TestClient, auth_headers: dict
+):
+    body = b"title\n" + b"x" * 100 + b'\nKept\n"' + b"y" * 100 + b"\nAlso kept\n"
+
+    with patch("app.task_io.MAX_IMPORT_LINE_SIZE", 64):
+        response = client.post(
+            "/tasks/import?format=csv", content=body, headers=auth_headers
+        )
+
+    result = response.json()
+    assert result["imported"] == 2
+    assert [error["index"] for error in result["errors"]] == [0, 2]
+    tasks = client.get("/tasks?sort_by=title", headers=auth_headers).json()
+    assert [task["title"] for task in tasks] == ["Also kept", "Kept"]
+
+
+def test_failed_import_rolls_back_and_invalidates(
+    client: TestClient, auth_headers: dict, db_session: Session, test_user, fake_redis
+):
+    calls = []
+
+    async def fail_second_chunk(db, rows):
+        calls.append(1)
+        if len(calls) == 2:
+            raise RuntimeError("connection lost")
+        await copy_tasks(db, rows)
+
+    body = b'{"title": "First"}\n{"title": "Second"}\n'
+    with patch("app.app.IMPORT_CHUNK_SIZE", 1), patch(
+        "app.app.copy_tasks", fail_second_chunk
+    ):
+        try:
+            client.post("/tasks/import", content=body, headers=auth_headers)
+        except RuntimeError:
+            pass
+
+    assert fake_redis.get(f"tasks:{test_user['username']}:gen") == b"1"
+    assert client.get("/tasks", headers=auth_headers).json() == []
+
+
+def test_import_rows_reach_cursor_taken_during_import(
+    client: TestClient, auth_headers: dict
+):
+    clock = [utcnow()]
+    cursors = []
+
+    async def sync_during_import(db, rows):
+        await copy_tasks(db, rows)
+        # The import outlasts SYNC_OVERLAP and a client syncs meanwhile.
+        clock[0] += 2 * SYNC_OVERLAP
+        principal = SimpleNamespace(id=rows[0]["owner_id"])
+        async for other in app.dependency_overrides[get_db]():
+            changes = await read_task_changes(db=other, principal=principal)
+            cursors.append(changes.cursor)
+
+    body = b'{"title": "First"}\n{"title": "Second"}\n'
+    with patch("app.app.IMPORT_CHUNK_SIZE", 1), patch(
+        "app.app.copy_tasks", sync_during_import
+    ), patch("app.app.utcnow", lambda: clock[0]):
+        response = client.post("/tasks/import", content=body, headers=auth_headers)
+    assert response.json()["imported"] == 2
+
+    changes = client.get(
+        f"/tasks/changes?since={cursors[0]}", headers=auth_headers
+    ).json()
+    assert [task["title"] for task in changes["changed"]] == ["First", "Second"]
+
+
+def test_read_tasks_conditional_get(
+    client: TestClient, auth_headers: dict, db_session: Session, test_user
+):
+    user = db_session.query(User).filter(User.username == test_user["username"]).first()
+    create_task_direct(db_session, user.id, "Cached")
+
+    first = client.get("/tasks", headers=auth_headers)
+    etag = first.headers["ETag"]
+    assert first.headers["Cache-Control"] == "private, no-cache"
+
+    # Served from the cache page without a database round trip.
+    with patch("app.app.AsyncSession.execute", side_effect=AssertionError):
+        not_modified = client.get(
+            "/tasks", headers={**auth_headers, "If-None-Match": etag}
+        )
+    assert not_modified.status_code == 304
+    assert not_modified.content == b""
+    assert not_modified.headers["ETag"] == etag
+
+    client.post("/tasks", json={"title": "Another"}, headers=auth_headers)
+    changed = client.get("/tasks", headers={**auth_headers, "If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+    assert len(changed.json()) == 2
+
+
+def test_read_tasks_not_modified_without_loading_task_set(
+    client: TestClient, auth_headers: dict, db_session: Session, test_user
+):
+    user = db_session.query(User).filter(User.username == test_user["username"]).first()
+    create_task_direct(db_session, user.id, "Cached")
+    etag = client.get("/tasks?sort_by=title", headers=auth_headers).headers["ETag"]
+    local_task_sets.clear()
+
+    with patch("app.app.get_or_load_task_set", side_effect=AssertionError), patch(
+        "app.app.derive_task_page", side_effect=AssertionError
+    ):
+        response = client.get(
+            "/tasks?sort_by=title", headers={**auth_headers, "If-None-Match": etag}
+        )
+
+    assert response.status_code == 304
+
+
+def test_read_tasks_etag_survives_unrelated_invalidation(
+    client: TestClient, auth_headers: dict, db_session: Session, test_user
+):
+    etag = client.get("/tasks?sort_by=title", headers=auth_headers).headers["ETag"]
+    created = client.post("/tasks", json={"title": "Tmp"}, headers=auth_headers)
+    client.delete(f"/tasks/{created.json()['id']}", headers=auth_headers)
+
+    response = client.get(
+        "/tasks?sort_by=title", headers={**auth_headers, "If-None-Match": etag}
+    )
+    assert response.status_code == 304
+
+
+def test_task_changes_since_cursor(
+    client: TestClient,
+    auth_headers: dict,
+    db_session: Session,
+    test_user,
+    monkeypatch,
+):
+    monkeypatch.setattr("app.app.SYNC_OVERLAP", timedelta(0))
+    user = db_session.query(User).filter(User.username == test_user["username"]).first()
+    kept = create_task_direct(db_session, user.id, "Kept")
+    edited = create_task_direct(db_session, user.id, "Edited")
+    removed = create_task_direct(db_session, user.id, "Removed")
+    bulk_removed = create_task_direct(db_session, user.id, "Bulk removed")
+
+    snapshot = client.get("/tasks/changes", headers=auth_headers).json()
+    assert [task["title"] for task in snapshot["changed"]] == [
+        "Kept",
+        "Edited",
+        "Removed",
+        "Bulk removed",
+    ]
+    assert snapshot["deleted"] == []
+
+    client.put(
+        f"/tasks/{edited.id}", json={"title": "Edited again"}, headers=auth_headers
+    )
+    client.delete(f"/tasks/{removed.id}", headers=auth_headers)
+    client.request(
+        "DELETE", "/tasks/bulk", json=[bulk_removed.id], headers=auth_headers
+    )
+    created = client.post("/tasks", json={"title": "New"}, headers=auth_headers).json()
+
+    response = client.get(
+        f"/tasks/changes?since={snapshot['cursor']}", headers=auth_headers
+    )
+
+    assert response.status_code == 200
+    delta = response.json()
+    assert [task["id"] for task in delta["changed"]] == [edited.id, created["id"]]
+    assert delta["changed"][0]["title"] == "Edited again"
+    assert delta["deleted"] == sorted([removed.id, bulk_removed.id])
+    assert kept.id not in [task["id"] for task in delta["changed"]]
+    db_session.expire_all()
+    assert db_session.get(Task, edited.id).version == 2
+    assert db_session.get(Task, kept.id).version == 1
+
+    empty = client.get(f"/tasks/changes?since={delta['cursor']}", headers=auth_headers)
+    assert empty.json()["changed"] == [] and empty.json()["deleted"] == []
+
+
+def test_task_changes_before_retention_returns_full_snapshot(
+    client: TestClient, auth_headers: dict, db_session: Session, test_user
+):
+    user = db_session.query(User).filter(User.username == test_user["username"]).first()
+    kept = create_task_direct(db_session, user.id, "Kept")
+    removed_id = create_task_direct(db_session, user.id, "Removed").id
+    long_ago = utcnow() - TASK_DELETION_RETENTION - timedelta(days=1)
+    db_session.add(TaskDeletion(task_id=999, owner_id=user.id, deleted_at=long_ago))
+    db_session.commit()
+
+    client.delete(f"/tasks/{removed_id}", headers=auth_headers)
+    response = client.get(
+        "/tasks/changes",
+        params={"since": encode_sync_cursor(long_ago)},
+        headers=auth_headers,
+    )
+
+    assert response.json()["full"] is True
+    assert [task["id"] for task in response.json()["changed"]] == [kept.id]
+    db_session.expire_all()
+    tombstones = db_session.query(TaskDeletion.task_id).all()
+    assert tombstones == [(removed_id,)]
+
+
+def test_task_changes_rejects_invalid_cursor(client: TestClient, auth_headers: dict):
+    response = client.get("/tasks/changes?since=garbage", headers=auth_headers)
+    assert response.status_code == 400
+    for payload in ({"t": 5}, {"t": "yesterday"}, ["2026-01-01T00:00:00"]):
+        response = client.get(
+            "/tasks/changes",
+            params={"since": crafted_cursor(payload)},
+            headers=auth_headers,
+        )
+        assert response.status_code == 400
+
+
+def test_task_changes_cursor_with_utc_offset(
+    client: TestClient, auth_headers: dict, db_session: Session, test_user
+):
+    user = db_session.query(User).filter(User.username == test_user["username"]).first()
+    create_task_direct(db_session, user.id, "Old")
+    # An hour ahead in a +03:00 zone is still in the future in naive UTC.
+    ahead = (utcnow() + timedelta(hours=4)).isoformat() + "+03:00"
+
+    response = client.get(
+        "/tasks/changes",
+        params={"since": crafted_cursor({"t": ahead})},
+        headers=auth_headers,
+    )
+
+    assert response.status_code == 200
+    assert response.json()["full"] is False
+    assert response.json()["changed"] == []
+
+
+TASK_VIEW_QUERIES = [
+    {},
+    {"sort_by": "title"},
+    {"sort_by": "priority", "limit": 2},
+    {"sort_by": "created_at", "limit": 3},
+    {"sort_by": "status", "top": 3, "limit": 2},
+    {"top": 4},
+    {"search": "report", "sort_by": "title"},
+    {"search": "QUARTERLY report"},
+    {"status": ["в работе", "завершено"], "sort_by": "title"},
+    {"priority_min": 2, "priority_max": 7, "limit": 2},
+    {"sort_by": "unknown", "limit": 4},
+]
+
+
+def test_derived_views_match_database_queries(
+    client: TestClient, auth_headers: dict, db_session: Session, test_user, monkeypatch
+):
+    user = db_session.query(User).filter(User.username == test_user["username"]).first()
+    tasks = [
+        create_task_direct(db_session, user.id, title, priority, task_status)
+        for title, priority, task_status in [
+            ("Quarterly report", 3, "в работе"),
+            ("Bug triage", 7, "в ожидании"),
+            ("report review", 3, "завершено"),
+            ("Alpha", 1, "в работе"),
+            ("Zeta", 9, "в ожидании"),
+            ("Beta", 7, "завершено"),
+        ]
+    ]
+
+    derived = [_fetch_all_pages(client, auth_headers, q) for q in TASK_VIEW_QUERIES]
+    monkeypatch.setattr("app.app.FULL_SET_MAX_TASKS", 0)
+    # A no-op update bumps the generation so the task set is reloaded.
+    client.put(
+        f"/tasks/{tasks[0].id}",
+        json={
+            "title": "Quarterly report",
+            "description": "",
+            "priority": 3,
+            "status": "в работе",
+        },
+        headers=auth_headers,
+    )
+    rebuilds_before = client.get("/metrics/cache").json()["rebuilds"]
+    queried = [_fetch_all_pages(client, auth_headers, q) for q in TASK_VIEW_QUERIES]
+
+    assert client.get("/metrics/cache").json()["rebuilds"] > rebuilds_before
+    assert derived == queried
+
+
+def test_new_views_are_derived_without_database(
+    client: TestClient, auth_headers: dict, db_session: Session, test_user
+):
+    user = db_session.query(User).filter(User.username == test_user["username"]).first()
+    create_task_direct(db_session, user.id, "First", priority=2)
+    create_task_direct(db_session, user.id, "Second", priority=8)
+    client.get("/tasks", headers=auth_headers)
+
+    with patch("app.app.AsyncSession.execute", side_effect=AssertionError):
+        response = client.get(
+            "/tasks?sort_by=priority&search=sec&top=1", headers=auth_headers
+        )
+
+    assert [task["title"] for task in response.json()] == ["Second"]
+    stats = client.get("/metrics/cache").json()
+    assert stats["task_set_misses"] >= 1 and stats["task_set_l1_hits"] >= 1
+
+
+def test_postgres_searches_not_ranked_are_derived_without_database(
+    client: TestClient, auth_headers: dict, db_session: Session, test_user, monkeypatch
+):
+    user = db_session.query(User).filter(User.username == test_user["username"]).first()
+    create_task_direct(db_session, user.id, "Quarterly report", priority=2)
+    create_task_direct(db_session, user.id, "Export reports", priority=8)
+    create_task_direct(db_session, user.id, "Passport renewal", priority=5)
+    client.get("/tasks", headers=auth_headers)
+    monkeypatch.setattr(SQLiteDialect_aiosqlite, "name", "postgresql")
+
+    with patch("app.app.AsyncSession.execute", side_effect=AssertionError):
+        by_title = client.get("/tasks?sort_by=title&search=REP", headers=auth_headers)
+        top = client.get("/tasks?search=port&top=1", headers=auth_headers)
+
+    # Prefix matches per word, like the to_tsquery ``term:*`` filter.
+    assert [task["title"] for task in by_title.json()] == [
+        "Export reports",
+        "Quarterly report",
+    ]
+    assert top.json() == []
+
+
+def test_write_through_keeps_task_set_warm(
+    client: TestClient, auth_headers: dict, db_session: Session, test_user, monkeypatch
+):
+    monkeypatch.setattr("app.cache.CACHE_WRITE_THROUGH", True)
+    user = db_session.query(User).filter(User.username == test_user["username"]).first()
+    kept = create_task_direct(db_session, user.id, "Kept", priority=1)
+    edited = create_task_direct(db_session, user.id, "Edited", priority=2)
+    removed = create_task_direct(db_session, user.id, "Removed", priority=3)
+    client.get("/tasks", headers=auth_headers)
+    misses_before = client.get("/metrics/cache").json()["task_set_misses"]
+
+    created = client.post(
+        "/tasks", json={"title": "Created", "priority": 5}, headers=auth_headers
+    ).json()
+    client.put(
+        f"/tasks/{edited.id}",
+        json={"title": "Edited once", "priority": 2, "status": "в работе"},
+        headers=auth_headers,
+    )
+    client.patch(
+        "/tasks/bulk",
+        json=[{"id": edited.id, "title": "Edited twice", "priority": 4}],
+        headers=auth_headers,
+    )
+    client.delete(f"/tasks/{removed.id}", headers=auth_headers)
+    response = client.get("/tasks?sort_by=priority", headers=auth_headers)
+
+    assert client.get("/metrics/cache").json()["task_set_misses"] == misses_before
+    assert [(task["id"], task["title"]) for task in response.json()] == [
+        (created["id"], "Created"),
+        (edited.id, "Edited twice"),
+        (kept.id, "Kept"),
+    ]
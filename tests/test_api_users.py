@@ -4,6 +4,19 @@ from app.models import User
 from sqlalchemy.exc import IntegrityError
 import pytest
 from datetime import timedelta
+from jose import jwt
+
+from app import auth, rate_limit
+from app.auth import (
+    ALGORITHM,
+    SECRET_KEY,
+    create_access_token,
+    handle_revocation_message,
+    token_cache,
+    token_digest,
+    user_id_cache,
+)
+from app.passwords import pwd_context
 
 
 def test_create_user(client: TestClient, db_session: Session):
@@ -43,6 +56,23 @@ def test_login_for_access_token(client: TestClient, test_user, db_session: Sessi
     assert data["token_type"] == "bearer"
 
 
+def test_login_rehashes_outdated_password(client: TestClient, db_session: Session):
+    weak_hash = pwd_context.handler().using(rounds=1000).hash("oldpassword")
+    db_session.add(User(username="legacyhash", password_hash=weak_hash))
+    db_session.commit()
+
+    response = client.post(
+        "/token", data={"username": "legacyhash", "password": "oldpassword"}
+    )
+
+    assert response.status_code == 200
+    db_session.expire_all()
+    user = db_session.query(User).filter(User.username == "legacyhash").first()
+    assert user.password_hash != weak_hash
+    assert not pwd_context.needs_update(user.password_hash)
+    assert pwd_context.verify("oldpassword", user.password_hash)
+
+
 def test_login_wrong_password(client: TestClient, test_user, db_session: Session):
     login_data = {"username": test_user["username"], "password": "wrongpassword"}
     response = client.post("/token", data=login_data)
@@ -57,3 +87,179 @@ def test_login_nonexistent_user(client: TestClient, db_session: Session):
     assert response.status_code == 401
     data = response.json()
     assert data["detail"] == "Invalid username or password"
+
+
+def test_login_token_carries_user_id(
+    client: TestClient, test_user, db_session: Session
+):
+    login_data = {"username": test_user["username"], "password": test_user["password"]}
+    token = client.post("/token", data=login_data).json()["access_token"]
+
+    payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    user = db_session.query(User).filter(User.username == test_user["username"]).first()
+    assert payload["uid"] == user.id
+
+
+def test_read_users_me(
+    client: TestClient, test_user, auth_headers, db_session: Session
+):
+    response = client.get("/users/me", headers=auth_headers)
+    assert response.status_code == 200
+    user = db_session.query(User).filter(User.username == test_user["username"]).first()
+    assert response.json() == {"id": user.id, "username": user.username}
+
+
+def test_read_users_me_legacy_token(
+    client: TestClient, test_user, db_session: Session
+):
+    legacy_token = create_access_token(
+        {"sub": test_user["username"]}, timedelta(minutes=30)
+    )
+    headers = {"Authorization": f"Bearer {legacy_token}"}
+
+    response = client.get("/users/me", headers=headers)
+    assert response.status_code == 200
+    user = db_session.query(User).filter(User.username == test_user["username"]).first()
+    assert response.json()["id"] == user.id
+    assert user_id_cache[test_user["username"]] == user.id
+
+
+def test_legacy_token_for_unknown_user(client: TestClient, db_session: Session):
+    legacy_token = create_access_token({"sub": "ghost"}, timedelta(minutes=30))
+    headers = {"Authorization": f"Bearer {legacy_token}"}
+
+    response = client.get("/users/me", headers=headers)
+    assert response.status_code == 401
+
+
+def test_repeat_requests_skip_token_verification(
+    client: TestClient, test_user, auth_headers, db_session: Session, monkeypatch
+):
+    calls = []
+    decode = auth.decode_access_token
+
+    def counting_decode(token):
+        calls.append(token)
+        return decode(token)
+
+    monkeypatch.setattr(auth, "decode_access_token", counting_decode)
+
+    for _ in range(3):
+        assert client.get("/users/me", headers=auth_headers).status_code == 200
+    assert len(calls) == 1
+
+
+def test_logout_revokes_token(client: TestClient, test_user, db_session: Session):
+    login_data = {"username": test_user["username"], "password": test_user["password"]}
+    token = client.post("/token", data=login_data).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    assert client.get("/users/me", headers=headers).status_code == 200
+
+    assert client.post("/logout", headers=headers).status_code == 204
+
+    response = client.get("/users/me", headers=headers)
+    assert response.status_code == 401
+    assert response.json()["detail"] == "Token revoked"
+    # A worker that never saw the token still finds the revocation in Redis.
+    auth.revoked_tokens.clear()
+    token_cache.clear()
+    assert client.get("/users/me", headers=headers).status_code == 401
+
+
+def test_revocation_message_drops_cached_token(
+    client: TestClient, test_user, auth_headers, db_session: Session
+):
+    token = auth_headers["Authorization"].removeprefix("Bearer ")
+    assert client.get("/users/me", headers=auth_headers).status_code == 200
+    digest = token_digest(token)
+    assert token_cache.get(digest) is not None
+    exp = token_cache.get(digest)["exp"]
+
+    handle_revocation_message(f"{digest.hex()}:{exp}".encode())
+
+    assert token_cache.get(digest) is None
+    assert client.get("/users/me", headers=auth_headers).status_code == 401
+
+
+def test_revocation_during_redis_check_is_not_cached(
+    client: TestClient, test_user, auth_headers, monkeypatch
+):
+    token = auth_headers["Authorization"].removeprefix("Bearer ")
+    digest = token_digest(token)
+    exists = auth.cache.redis_client.exists
+
+    async def exists_while_revoked(*keys):
+        # The pub/sub message arrives while EXISTS is still in flight.
+        handle_revocation_message(f"{digest.hex()}:{9999999999}".encode())
+        return await exists(*keys)
+
+    monkeypatch.setattr(auth.cache.redis_client, "exists", exists_while_revoked)
+
+    assert client.get("/users/me", headers=auth_headers).status_code == 401
+    assert token_cache.get(digest) is None
+
+
+def test_refresh_token_rotation(client: TestClient, test_user, db_session: Session):
+    login_data = {"username": test_user["username"], "password": test_user["password"]}
+    refresh_token = client.post("/token", data=login_data).json()["refresh_token"]
+
+    response = client.post("/token/refresh", json={"refresh_token": refresh_token})
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["refresh_token"] != refresh_token
+    headers = {"Authorization": f"Bearer {data['access_token']}"}
+    assert client.get("/users/me", headers=headers).json()["username"] == "testuser"
+    # The redeemed token cannot be replayed.
+    reused = client.post("/token/refresh", json={"refresh_token": refresh_token})
+    assert reused.status_code == 401
+    assert reused.json()["detail"] == "Invalid refresh token"
+
+
+def test_logout_revokes_refresh_token(
+    client: TestClient, test_user, db_session: Session
+):
+    login_data = {"username": test_user["username"], "password": test_user["password"]}
+    tokens = client.post("/token", data=login_data).json()
+    headers = {"Authorization": f"Bearer {tokens['access_token']}"}
+
+    response = client.post(
+        "/logout", json={"refresh_token": tokens["refresh_token"]}, headers=headers
+    )
+
+    assert response.status_code == 204
+    refreshed = client.post(
+        "/token/refresh", json={"refresh_token": tokens["refresh_token"]}
+    )
+    assert refreshed.status_code == 401
+
+
+def test_login_rate_limited_per_username(
+    client: TestClient, test_user, db_session: Session, monkeypatch
+):
+    monkeypatch.setattr(rate_limit, "AUTH_RATE_LIMIT_PER_USERNAME", 3)
+    login_data = {"username": test_user["username"], "password": "wrongpassword"}
+
+    statuses = [client.post("/token", data=login_data).status_code for _ in range(4)]
+
+    assert statuses == [401, 401, 401, 429]
+    response = client.post(
+        "/token", data={**login_data, "password": test_user["password"]}
+    )
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+    other = client.post("/token", data={"username": "someone", "password": "x"})
+    assert other.status_code == 401
+
+
+def test_registration_rate_limited_per_ip(
+    client: TestClient, db_session: Session, monkeypatch
+):
+    monkeypatch.setattr(rate_limit, "AUTH_RATE_LIMIT_PER_IP", 2)
+
+    statuses = [
+        client.post("/users", json={"username": f"u{i}", "password": "p"}).status_code
+        for i in range(3)
+    ]
+
+    assert statuses == [200, 200, 429]
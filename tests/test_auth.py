@@ -12,6 +12,7 @@ from app.auth import (
     ALGORITHM,
     oauth2_scheme,
 )
+from app.passwords import pwd_context, verify_and_update_password
 
 
 def test_password_hashing_and_verification():
@@ -22,6 +23,19 @@ def test_password_hashing_and_verification():
     assert not verify_password("wrongpassword", hashed_password)
 
 
+def test_outdated_hash_is_upgraded_on_verify():
+    password = "securepassword123"
+    weak_hash = pwd_context.handler().using(rounds=1000).hash(password)
+
+    valid, new_hash = verify_and_update_password(password, weak_hash)
+
+    assert valid
+    assert new_hash is not None and new_hash != weak_hash
+    assert not pwd_context.needs_update(new_hash)
+    assert verify_and_update_password(password, new_hash) == (True, None)
+    assert verify_and_update_password("wrongpassword", weak_hash) == (False, None)
+
+
 def test_create_access_token():
     data = {"sub": "testuser"}
     token = create_access_token(data.copy())
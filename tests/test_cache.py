@@ -1,53 +1,125 @@
 import pytest
+import asyncio
 import json
+import time
 from datetime import datetime, timezone
-import redis
+import redis.asyncio as redis
 
 from app.cache import (
-    generate_cache_key,
+    describe_task_query,
     get_cached_tasks,
     set_cached_tasks,
     invalidate_user_cache,
+    generation_key,
+    handle_invalidation_message,
+    listen_for_invalidations,
+    cache_stats,
+    pack_page,
+    page_etag,
+    unpack_page,
+    CachedPage,
+    rebuild_lock_key,
+    variants_key,
+    get_or_load_task_set,
+    write_through_tasks,
+    get_or_build_user_tasks,
+    get_user_page,
+    CountingConnection,
+    RoundTripCounter,
+    RoundTripMiddleware,
+    request_round_trips,
+    serialize_tasks,
+    task_set_key,
+    task_set_too_large_key,
+    should_refresh_early,
+    INVALIDATION_CHANNEL,
     CACHE_TTL,
 )
 import app.cache as cache_module_to_patch
+from app.filters import make_task_filters
+from app.models import Task
+from app.pagination import get_ordering
+from app.search import search_terms
 from app.schemas import TaskRead
+from pydantic import TypeAdapter
+from typing import List
+
+pytestmark = pytest.mark.anyio
 
 _test_redis_client = None
 
 
 @pytest.fixture(autouse=True)
-def managed_redis_client(monkeypatch):
+async def managed_redis_client(monkeypatch):
     global _test_redis_client
 
-    _test_redis_client = redis.Redis(
-        host="redis", port=6379, db=0, decode_responses=True
-    )
+    _test_redis_client = redis.Redis(host="redis", port=6379, db=0)
 
     try:
-        _test_redis_client.ping()
-    except redis.exceptions.ConnectionError as e:
+        await _test_redis_client.ping()
+    except redis.ConnectionError as e:
         pytest.fail(f"Cannot connect to test Redis at host 'redis': {e}")
 
     monkeypatch.setattr(cache_module_to_patch, "redis_client", _test_redis_client)
 
-    _test_redis_client.flushdb()
+    await _test_redis_client.flushdb()
 
     yield
 
+    await _test_redis_client.aclose()
+
+
+def describe(sort_by=None, search=None, top=None, limit=None, cursor=None, **filters):
+    terms = sorted(set(search_terms(search)))
+    ordering = get_ordering(sort_by, top)
+    return describe_task_query(
+        ordering, terms, top, limit, cursor, make_task_filters(**filters)
+    )
+
+
+async def page_key(username: str, descriptor: bytes = b"") -> str:
+    cache_key, _ = await get_user_page(username, descriptor)
+    return cache_key
+
+
+async def user_generation(username: str) -> int:
+    # Keys are tasks:<user>:v<generation>:<digest>.
+    return int((await page_key(username)).split(":")[2][1:])
 
-def test_generate_cache_key():
-    key1 = generate_cache_key("user1")
-    assert key1 == "tasks:user1:sort=None:search=None:top=None"
 
-    key2 = generate_cache_key("user2", sort_by="title", search="keyword", top=5)
-    assert key2 == "tasks:user2:sort=title:search=keyword:top=5"
+async def test_page_cache_key():
+    key1 = await page_key("user1", describe())
+    key2 = await page_key("user1", describe(sort_by="title", search="a b"))
+    key3 = await page_key("user1", describe(limit=10, cursor="abc"))
+
+    assert key1.startswith("tasks:user1:v0:")
+    assert len({key1, key2, key3}) == 3
+    assert len({len(key1), len(key2), len(key3)}) == 1
+    long_search = await page_key("user1", describe(search="word " * 500))
+    assert len(long_search) == len(key1)
+
+
+async def test_page_cache_key_is_canonical():
+    async def key(**query):
+        return await page_key("canonical_user", describe(**query))
+
+    assert await key(search="  Foo BAR ") == await key(search="bar foo")
+    assert await key(sort_by="id") == await key(sort_by="unknown") == await key()
+    assert await key(statuses=["b", "a", "b"], priority_min=1) == await key(
+        statuses=("a", "b"), priority_min=1
+    )
+    assert await key(sort_by="title") != await key(sort_by="status")
+
+
+async def test_page_cache_key_uses_generation():
+    global _test_redis_client
+    await _test_redis_client.set(generation_key("user4"), 7)
 
-    key3 = generate_cache_key("user3", sort_by="status")
-    assert key3 == "tasks:user3:sort=status:search=None:top=None"
+    key = await page_key("user4", describe(sort_by="title"))
+    assert key.startswith("tasks:user4:v7:")
 
 
-def test_get_cached_tasks_hit():
+async def test_get_cached_tasks_hit():
     global _test_redis_client
     cache_key = "test_key_hit_real_redis"
     task_created_at = datetime.now(timezone.utc)
@@ -61,35 +133,38 @@ def test_get_cached_tasks_hit():
     )
     task_data_dict = task_obj.model_dump(mode="json")
 
-    _test_redis_client.set(cache_key, json.dumps([task_data_dict]))
+    page = CachedPage(json.dumps([task_data_dict]).encode(), "next-page")
+    await _test_redis_client.set(cache_key, pack_page(page))
 
     try:
-        result = get_cached_tasks(cache_key)
+        result = await get_cached_tasks(cache_key)
 
         assert result is not None
+        assert result.next_cursor == "next-page"
+        result = json.loads(result.body)
         assert len(result) == 1
         retrieved_task = result[0]
         assert retrieved_task["title"] == "Test Task"
         assert retrieved_task["created_at"] == task_data_dict["created_at"]
         assert retrieved_task["id"] == task_obj.id
     finally:
-        _test_redis_client.delete(cache_key)
+        await _test_redis_client.delete(cache_key)
 
 
-def test_get_cached_tasks_miss():
+async def test_get_cached_tasks_miss():
     global _test_redis_client
     cache_key = "test_key_miss_real_redis"
-    _test_redis_client.delete(cache_key)
+    await _test_redis_client.delete(cache_key)
 
-    result = get_cached_tasks(cache_key)
+    result = await get_cached_tasks(cache_key)
 
     assert result is None
 
 
-def test_set_cached_tasks():
+async def test_set_cached_tasks():
     global _test_redis_client
     cache_key = "test_set_key_real_redis"
-    _test_redis_client.delete(cache_key)
+    await _test_redis_client.delete(cache_key)
 
     tasks_to_cache = [
         TaskRead(
@@ -113,52 +188,474 @@ def test_set_cached_tasks():
     expected_tasks_data = [task.model_dump(mode="json") for task in tasks_to_cache]
 
     try:
-        set_cached_tasks(cache_key, tasks_to_cache)
+        await set_cached_tasks(cache_key, tasks_to_cache)
 
-        cached_data_json = _test_redis_client.get(cache_key)
+        cached_data_json = await _test_redis_client.get(cache_key)
         assert cached_data_json is not None
 
-        cached_data = json.loads(cached_data_json)
+        cached_data = json.loads(unpack_page(cached_data_json).body)
         assert cached_data == expected_tasks_data
 
-        ttl = _test_redis_client.ttl(cache_key)
+        ttl = await _test_redis_client.ttl(cache_key)
         assert ttl > 0
         assert ttl <= CACHE_TTL
     finally:
-        _test_redis_client.delete(cache_key)
+        await _test_redis_client.delete(cache_key)
 
 
-def test_invalidate_user_cache_with_keys():
+async def test_set_cached_tasks_matches_response_model_json():
+    tasks = [
+        TaskRead(
+            id=1,
+            title="Задача",
+            description=None,
+            status="в ожидании",
+            created_at=datetime.now(timezone.utc),
+            priority=3,
+        )
+    ]
+
+    page = await set_cached_tasks("test_serialization_key", tasks)
+
+    assert page.body == TypeAdapter(List[TaskRead]).dump_json(tasks)
+    assert await get_cached_tasks("test_serialization_key") == page
+
+
+async def test_invalidate_user_cache_bumps_generation():
     global _test_redis_client
     username = "user_to_invalidate_real"
-    key1 = f"tasks:{username}:key1_real"
-    key2 = f"tasks:{username}:key2_real"
-    other_user_key = "tasks:other_user_real:key3"
+    other_username = "other_user_real"
 
-    _test_redis_client.delete(key1, key2, other_user_key)
-    _test_redis_client.set(key1, "data1")
-    _test_redis_client.set(key2, "data2")
-    _test_redis_client.set(other_user_key, "data3")
+    old_key = await page_key(username, describe(sort_by="title"))
+    other_key = await page_key(other_username)
+    await _test_redis_client.set(old_key, "data1")
+    await _test_redis_client.set(other_key, "data2")
 
-    try:
-        invalidate_user_cache(username)
+    await invalidate_user_cache(username)
 
-        assert _test_redis_client.get(key1) is None
-        assert _test_redis_client.get(key2) is None
-        assert _test_redis_client.get(other_user_key) is not None
-    finally:
-        _test_redis_client.delete(other_user_key)
+    assert await user_generation(username) == 1
+    assert await user_generation(other_username) == 0
+    new_key = await page_key(username, describe(sort_by="title"))
+    assert new_key != old_key
+    assert await get_cached_tasks(new_key) is None
+    assert await page_key(other_username) == other_key
 
 
-def test_invalidate_user_cache_no_keys():
+async def test_invalidate_user_cache_does_not_scan():
     global _test_redis_client
     username = "user_with_no_cache_real"
-    pattern = f"tasks:{username}:*"
 
-    existing_keys = _test_redis_client.keys(pattern)
-    if existing_keys:
-        _test_redis_client.delete(*existing_keys)
+    await invalidate_user_cache(username)
+    await invalidate_user_cache(username)
+
+    assert await user_generation(username) == 2
+    keys = await _test_redis_client.keys(f"tasks:{username}:*")
+    assert keys == [generation_key(username).encode()]
+
+
+async def test_l1_serves_repeated_reads_from_memory():
+    global _test_redis_client
+    cache_key = await page_key("l1_user")
+    task = TaskRead(
+        id=1,
+        title="Task 1",
+        description=None,
+        status="pending",
+        created_at=datetime.now(timezone.utc),
+        priority=1,
+    )
+    await set_cached_tasks(cache_key, [task])
+    await _test_redis_client.delete(cache_key)
+    hits_before = cache_stats["l1_hits"]
+
+    result = await get_cached_tasks(cache_key)
+
+    assert json.loads(result.body) == [task.model_dump(mode="json")]
+    assert cache_stats["l1_hits"] == hits_before + 1
+
+
+async def test_l1_filled_from_redis_hit():
+    global _test_redis_client
+    cache_key = await page_key("l1_fill_user")
+    await _test_redis_client.set(cache_key, b'\n[{"id": 1}]')
+    redis_hits_before = cache_stats["redis_hits"]
+
+    expected = CachedPage(b'[{"id": 1}]', None, page_etag(b'[{"id": 1}]'))
+    assert await get_cached_tasks(cache_key) == expected
+    await _test_redis_client.delete(cache_key)
+    assert await get_cached_tasks(cache_key) == expected
+    assert cache_stats["redis_hits"] == redis_hits_before + 1
+
+
+async def test_invalidation_message_moves_local_generation():
+    username = "pubsub_user"
+    old_key = await page_key(username)
+
+    handle_invalidation_message(f"{username}:3".encode())
+    assert await user_generation(username) == 3
+    assert await page_key(username) != old_key
+
+    handle_invalidation_message(f"{username}:2".encode())
+    assert await user_generation(username) == 3
+
+
+async def test_invalidation_listener_applies_published_generation():
+    global _test_redis_client
+    username = "listener_user"
+    assert await user_generation(username) == 0
+
+    listener = asyncio.create_task(listen_for_invalidations())
+    try:
+        for _ in range(50):
+            if await _test_redis_client.publish(INVALIDATION_CHANNEL, "garbage"):
+                break
+            await asyncio.sleep(0.02)
+        # A malformed message is logged and the listener keeps going.
+        await _test_redis_client.publish(INVALIDATION_CHANNEL, b"\xff:1")
+        await _test_redis_client.publish(INVALIDATION_CHANNEL, f"{username}:5")
+        for _ in range(50):
+            if await user_generation(username) == 5:
+                break
+            await asyncio.sleep(0.02)
+        assert await user_generation(username) == 5
+    finally:
+        listener.cancel()
+
+
+async def test_page_etag_tracks_content_and_cursor():
+    cache_key = await page_key("etag_user")
+    page = await set_cached_tasks(cache_key, [], "next")
+
+    assert page.etag == page_etag(page.body, "next")
+    assert page.etag != page_etag(page.body)
+    unpacked = unpack_page(pack_page(page))
+    assert (unpacked.etag, unpacked.next_cursor) == (page.etag, "next")
+    assert unpacked.expires_at == pytest.approx(page.expires_at, abs=0.001)
+
+
+def counting_builder(calls: list, delay: float = 0.05):
+    async def build():
+        calls.append(1)
+        await asyncio.sleep(delay)
+        return [], None
+
+    return build
+
+
+async def test_concurrent_misses_rebuild_once():
+    cache_key = await page_key("stampede_user")
+    calls = []
+    build = counting_builder(calls)
+
+    pages = await asyncio.gather(
+        *(get_or_build_user_tasks("stampede_user", b"", build) for _ in range(10))
+    )
+
+    assert len(calls) == 1
+    assert len({page.etag for page in pages}) == 1
+    assert await _test_redis_client.get(rebuild_lock_key(cache_key)) is None
+
+
+async def test_miss_waits_for_rebuild_in_another_worker():
+    cache_key = await page_key("locked_user")
+    await _test_redis_client.set(rebuild_lock_key(cache_key), "other", px=5000)
+    ready = CachedPage(b"[]", None, page_etag(b"[]"), time.time() + CACHE_TTL)
+
+    async def finish_elsewhere():
+        await asyncio.sleep(0.1)
+        await _test_redis_client.set(cache_key, pack_page(ready))
+
+    calls = []
+    page, _ = await asyncio.gather(
+        get_or_build_user_tasks("locked_user", b"", counting_builder(calls)),
+        finish_elsewhere(),
+    )
+
+    assert calls == []
+    assert page.body == b"[]"
+
+
+async def test_early_refresh_near_expiry():
+    cache_key = await page_key("xfetch_user")
+    page = await set_cached_tasks(cache_key, [], delta=0.0)
+    assert not should_refresh_early(page)
+    # A rebuild that took far longer than the remaining lifetime always refreshes.
+    expiring = page._replace(expires_at=time.time() + 1, delta=1e9)
+    assert should_refresh_early(expiring)
+    await _test_redis_client.set(cache_key, pack_page(expiring))
+    cache_module_to_patch.local_tasks.clear()
+
+    await _test_redis_client.set(rebuild_lock_key(cache_key), "other", px=5000)
+    calls = []
+    served = await get_or_build_user_tasks("xfetch_user", b"", counting_builder(calls))
+    assert calls == []
+    assert served.expires_at == pytest.approx(expiring.expires_at, abs=0.001)
+
+    await _test_redis_client.delete(rebuild_lock_key(cache_key))
+    refreshes_before = cache_stats["early_refreshes"]
+    refreshed = await get_or_build_user_tasks(
+        "xfetch_user", b"", counting_builder(calls)
+    )
+    assert calls == [1]
+    assert refreshed.expires_at > expiring.expires_at
+    assert cache_stats["early_refreshes"] == refreshes_before + 1
+
+
+async def test_cached_variants_are_capped_per_user(monkeypatch):
+    monkeypatch.setattr(cache_module_to_patch, "MAX_CACHED_VARIANTS", 3)
+    keys = [
+        await page_key("typing_user", describe(search=f"word{i}"))
+        for i in range(5)
+    ]
+    other_key = await page_key("quiet_user", describe())
+    await set_cached_tasks(other_key, [])
+
+    for key in keys:
+        await set_cached_tasks(key, [])
+
+    stored = [await _test_redis_client.exists(key) for key in keys]
+    assert stored == [0, 0, 1, 1, 1]
+    assert await _test_redis_client.zcard(variants_key(keys[0])) == 3
+    assert await get_cached_tasks(keys[0]) is None
+    assert await _test_redis_client.exists(other_key)
+
+
+def task_row(task_id: int, title: str, version: int = 1) -> Task:
+    return Task(
+        id=task_id,
+        title=title,
+        description=None,
+        status="в ожидании",
+        created_at=datetime(2026, 1, 1, 12, 0),
+        priority=2,
+        version=version,
+    )
+
+
+def task_loader(tasks, calls: list):
+    async def load():
+        calls.append(1)
+        return tasks
+
+    return load
+
+
+async def test_task_set_loaded_once_per_generation():
+    username = "set_user"
+    task = task_row(1, "Only")
+    calls = []
+
+    first = await get_or_load_task_set(username, task_loader([task], calls))
+    cache_module_to_patch.local_task_sets.clear()
+    second = await get_or_load_task_set(username, task_loader([], calls))
+
+    assert calls == [1]
+    assert first.complete and second == first
+    assert second.tasks[0].raw == serialize_tasks([TaskRead.model_validate(task)])[1:-1]
+
+    await invalidate_user_cache(username)
+    third = await get_or_load_task_set(username, task_loader([], calls))
+    assert calls == [1, 1] and third.tasks == []
+
+
+async def test_task_set_not_stored_after_concurrent_write():
+    username = "racing_user"
+
+    async def load_while_writing():
+        await invalidate_user_cache(username)
+        return []
+
+    await get_or_load_task_set(username, load_while_writing)
+
+    assert not await _test_redis_client.exists(task_set_key(username))
+
+
+async def test_read_after_write_does_not_join_older_load():
+    username = "read_your_writes_user"
+    started = asyncio.Event()
+
+    async def slow_load():
+        started.set()
+        await asyncio.sleep(0.1)
+        return [task_row(1, "old")]
+
+    async def fresh_load():
+        return [task_row(1, "new")]
+
+    slow = asyncio.create_task(get_or_load_task_set(username, slow_load))
+    await started.wait()
+    await invalidate_user_cache(username)
+    fresh = await get_or_load_task_set(username, fresh_load)
+    await slow
+
+    assert [entry.task.title for entry in fresh.tasks] == ["new"]
+
+
+async def test_large_task_set_is_marked_incomplete():
+    calls = []
+    task_set = await get_or_load_task_set("big_user", task_loader(None, calls))
+    cache_module_to_patch.local_task_sets.clear()
+
+    assert not task_set.complete
+    assert not (await get_or_load_task_set("big_user", task_loader([], calls))).complete
+    assert calls == [1]
+
+    # Writes do not make the user be measured again.
+    await invalidate_user_cache("big_user")
+    cache_module_to_patch.local_task_sets.clear()
+    assert not (await get_or_load_task_set("big_user", task_loader([], calls))).complete
+    assert calls == [1]
+    assert await _test_redis_client.ttl(task_set_too_large_key("big_user")) > 0
+
+
+async def test_write_through_patches_task_set(monkeypatch):
+    monkeypatch.setattr(cache_module_to_patch, "CACHE_WRITE_THROUGH", True)
+    username = "write_through_user"
+    calls = []
+    await get_or_load_task_set(
+        username, task_loader([task_row(1, "One"), task_row(2, "Two")], calls)
+    )
+
+    await write_through_tasks(
+        username,
+        created=[task_row(3, "Three")],
+        updated=[task_row(1, "One v2", version=2)],
+        deleted=[2],
+    )
+    # Arriving after the newer write and the delete, both are ignored.
+    await write_through_tasks(
+        username, updated=[task_row(1, "One v1"), task_row(2, "Two v2", version=2)]
+    )
+
+    task_set = await get_or_load_task_set(username, task_loader([], calls))
+    assert calls == [1]
+    assert await user_generation(username) == 2
+    assert sorted((e.task.id, e.task.title) for e in task_set.tasks) == [
+        (1, "One v2"),
+        (3, "Three"),
+    ]
+
+
+async def test_write_through_skips_stale_task_set(monkeypatch):
+    monkeypatch.setattr(cache_module_to_patch, "CACHE_WRITE_THROUGH", True)
+    username = "stale_set_user"
+    calls = []
+    await get_or_load_task_set(username, task_loader([task_row(1, "One")], calls))
+    await invalidate_user_cache(username)
+
+    await write_through_tasks(username, created=[task_row(2, "Two")])
+
+    task_set = await get_or_load_task_set(username, task_loader([], calls))
+    assert calls == [1, 1] and task_set.tasks == []
+
+
+async def test_write_through_drops_task_set_over_limit(monkeypatch):
+    monkeypatch.setattr(cache_module_to_patch, "CACHE_WRITE_THROUGH", True)
+    monkeypatch.setattr(cache_module_to_patch, "FULL_SET_MAX_TASKS", 1)
+    username = "growing_user"
+    await get_or_load_task_set(username, task_loader([task_row(1, "One")], []))
+
+    await write_through_tasks(username, created=[task_row(2, "Two")])
+
+    assert not await _test_redis_client.exists(task_set_key(username))
+
+
+async def test_failed_rebuild_releases_lock():
+    cache_key = await page_key("failing_user")
+
+    async def fail():
+        raise RuntimeError("database down")
+
+    with pytest.raises(RuntimeError):
+        await get_or_build_user_tasks("failing_user", b"", fail)
+
+    assert await _test_redis_client.get(rebuild_lock_key(cache_key)) is None
+
+
+@pytest.fixture
+async def counting_client(monkeypatch):
+    pool = redis.ConnectionPool(
+        host="redis", port=6379, db=0, connection_class=CountingConnection
+    )
+    client = redis.Redis(connection_pool=pool)
+    # Connect now so the handshake is not counted against the request.
+    await client.ping()
+    monkeypatch.setattr(cache_module_to_patch, "redis_client", client)
+    yield client
+    await client.aclose()
+    await pool.disconnect()
+
+
+async def count_round_trips(operation) -> int:
+    counter = RoundTripCounter()
+    token = request_round_trips.set(counter)
+    try:
+        await operation
+    finally:
+        request_round_trips.reset(token)
+    return counter.count
+
+
+async def test_cache_operations_take_one_round_trip(counting_client, monkeypatch):
+    username = "round_trip_user"
+    descriptor = describe(sort_by="title")
+    await get_or_build_user_tasks(username, descriptor, counting_builder([]))
+    await get_or_load_task_set(username, task_loader([task_row(1, "One")], []))
+    cache_module_to_patch.clear_local_cache()
+
+    assert await count_round_trips(
+        get_or_build_user_tasks(username, descriptor, counting_builder([]))
+    ) == 1
+    assert await count_round_trips(
+        get_or_load_task_set(username, task_loader([], []))
+    ) == 1
+    assert await count_round_trips(invalidate_user_cache(username)) == 1
+    monkeypatch.setattr(cache_module_to_patch, "CACHE_WRITE_THROUGH", True)
+    assert await count_round_trips(
+        write_through_tasks(username, created=[task_row(2, "Two")])
+    ) == 1
+
+
+async def test_large_user_cached_read_takes_one_round_trip(counting_client):
+    username = "large_round_trip_user"
+    descriptor = describe(sort_by="title")
+    await get_or_load_task_set(username, task_loader(None, []))
+    await invalidate_user_cache(username)
+    await get_or_build_user_tasks(username, descriptor, counting_builder([]))
+    cache_module_to_patch.local_tasks.clear()
+
+    async def cached_read():
+        task_set = await get_or_load_task_set(username, task_loader([], []))
+        assert not task_set.complete
+        await get_or_build_user_tasks(username, descriptor, counting_builder([]))
+
+    assert await count_round_trips(cached_read()) == 1
+
+
+async def test_round_trip_middleware_reports_count(counting_client):
+    async def endpoint(scope, receive, send):
+        await counting_client.get("first")
+        await counting_client.get("second")
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    await RoundTripMiddleware(endpoint)({"type": "http"}, None, send)
+
+    assert (b"x-redis-round-trips", b"2") in messages[0]["headers"]
+
+
+async def test_task_set_larger_than_lua_unpack_limit(monkeypatch):
+    monkeypatch.setattr(cache_module_to_patch, "FULL_SET_MAX_TASKS", 3000)
+    tasks = [task_row(task_id, f"Task {task_id}") for task_id in range(1, 3001)]
+    await get_or_load_task_set("many_tasks_user", task_loader(tasks, []))
+    cache_module_to_patch.local_task_sets.clear()
 
-    invalidate_user_cache(username)
+    calls = []
+    task_set = await get_or_load_task_set("many_tasks_user", task_loader([], calls))
 
-    assert _test_redis_client.keys(pattern) == []
+    assert calls == [] and len(task_set.tasks) == 3000
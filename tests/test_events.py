@@ -0,0 +1,119 @@
+import asyncio
+import orjson
+import pytest
+import time
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+from app.events import (
+    RESYNC_EVENT,
+    TASK_EVENTS_CHANNEL,
+    handle_task_event,
+    resync_all,
+    stream_task_events,
+    subscribe,
+    subscribers,
+    unsubscribe,
+)
+from app.models import User
+
+
+@pytest.fixture(autouse=True)
+def clear_subscribers():
+    subscribers.clear()
+    yield
+    subscribers.clear()
+
+
+@pytest.fixture
+def local_delivery(fake_redis):
+    """Deliver published events in-process, as the pub/sub listener would."""
+    pubsub = fake_redis.pubsub()
+    pubsub.subscribe(
+        **{TASK_EVENTS_CHANNEL: lambda message: handle_task_event(message["data"])}
+    )
+    thread = pubsub.run_in_thread(sleep_time=0.01, daemon=True)
+    yield
+    thread.stop()
+
+
+def drain(queue: asyncio.Queue) -> list:
+    events = []
+    while not queue.empty():
+        events.append(orjson.loads(queue.get_nowait()))
+    return events
+
+
+def wait_for_events(queue: asyncio.Queue, count: int, timeout: float = 2.0) -> list:
+    """Events delivered so far, waiting up to ``timeout`` for ``count`` of them."""
+    events = []
+    deadline = time.monotonic() + timeout
+    while len(events) < count and time.monotonic() < deadline:
+        time.sleep(0.01)
+        events += drain(queue)
+    return events
+
+
+def test_events_fan_out_to_the_users_streams_only():
+    first, second, other = subscribe(1), subscribe(1), subscribe(2)
+
+    handle_task_event(b'1\n{"type":"deleted","deleted":[5]}')
+
+    assert drain(first) == drain(second) == [{"type": "deleted", "deleted": [5]}]
+    assert other.empty()
+    unsubscribe(1, first)
+    unsubscribe(1, second)
+    assert 1 not in subscribers
+
+
+def test_slow_stream_gets_resync_instead_of_backlog(monkeypatch):
+    monkeypatch.setattr("app.events.EVENT_QUEUE_SIZE", 2)
+    queue = subscribe(1)
+
+    for task_id in range(3):
+        handle_task_event(b'1\n{"type":"deleted","deleted":[%d]}' % task_id)
+
+    assert drain(queue) == [{"type": "resync"}]
+    resync_all()
+    assert queue.get_nowait() == RESYNC_EVENT
+
+
+@pytest.mark.anyio
+async def test_stream_task_events_formats_sse():
+    stream = stream_task_events(7)
+    assert await stream.__anext__() == b"retry: 3000\n\n"
+    assert 7 in subscribers
+
+    handle_task_event(b'7\n{"type":"resync"}')
+
+    assert await stream.__anext__() == b'data: {"type":"resync"}\n\n'
+    await stream.aclose()
+    assert 7 not in subscribers
+
+
+def test_task_mutations_publish_events(
+    client: TestClient,
+    auth_headers: dict,
+    db_session: Session,
+    test_user,
+    local_delivery,
+):
+    user = db_session.query(User).filter(User.username == test_user["username"]).first()
+    queue = subscribe(user.id)
+
+    task = client.post("/tasks", json={"title": "Live"}, headers=auth_headers).json()
+    client.put(
+        f"/tasks/{task['id']}", json={"title": "Live, edited"}, headers=auth_headers
+    )
+    client.delete(f"/tasks/{task['id']}", headers=auth_headers)
+
+    events = wait_for_events(queue, 3)
+    assert [event["type"] for event in events] == ["created", "updated", "deleted"]
+    assert events[0]["tasks"] == [task]
+    assert events[1]["tasks"][0]["title"] == "Live, edited"
+    assert events[2]["deleted"] == [task["id"]]
+
+
+def test_task_events_requires_token(client: TestClient):
+    response = client.get("/tasks/events")
+    assert response.status_code == 401
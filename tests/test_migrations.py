@@ -0,0 +1,80 @@
+import pytest
+from alembic import command
+from alembic.autogenerate import compare_metadata
+from alembic.config import Config
+from alembic.migration import MigrationContext
+from sqlalchemy import create_engine, inspect, text
+
+from app.models import Base
+
+PROJECT_ROOT = __file__.rsplit("/tests/", 1)[0]
+
+
+def make_alembic_config(database_url: str) -> Config:
+    config = Config(f"{PROJECT_ROOT}/alembic.ini")
+    config.set_main_option("script_location", f"{PROJECT_ROOT}/migrations")
+    config.set_main_option("sqlalchemy.url", database_url)
+    config.attributes["configure_logger"] = False
+    return config
+
+
+@pytest.mark.filterwarnings("ignore:autogenerate skipping metadata-specified")
+def test_migrations_match_models(tmp_path):
+    database_url = f"sqlite:///{tmp_path / 'migrations.db'}"
+    command.upgrade(make_alembic_config(database_url), "head")
+
+    engine = create_engine(database_url)
+    with engine.connect() as connection:
+        diff = compare_metadata(MigrationContext.configure(connection), Base.metadata)
+    engine.dispose()
+
+    assert diff == []
+
+
+def test_migrations_adopt_create_all_schema(tmp_path):
+    database_url = f"sqlite:///{tmp_path / 'legacy.db'}"
+    engine = create_engine(database_url)
+    Base.metadata.tables["users"].create(engine)
+    Base.metadata.tables["tasks"].create(engine)
+
+    command.upgrade(make_alembic_config(database_url), "head")
+
+    index_names = {index["name"] for index in inspect(engine).get_indexes("tasks")}
+    engine.dispose()
+    assert "ix_tasks_owner_priority" in index_names
+
+
+def test_migrations_downgrade(tmp_path):
+    database_url = f"sqlite:///{tmp_path / 'downgrade.db'}"
+    config = make_alembic_config(database_url)
+    command.upgrade(config, "head")
+    command.downgrade(config, "base")
+
+    engine = create_engine(database_url)
+    table_names = inspect(engine).get_table_names()
+    engine.dispose()
+    assert table_names == ["alembic_version"]
+
+
+def test_migrations_backfill_updated_at(tmp_path):
+    database_url = f"sqlite:///{tmp_path / 'backfill.db'}"
+    config = make_alembic_config(database_url)
+    command.upgrade(config, "0003")
+    engine = create_engine(database_url)
+    with engine.begin() as connection:
+        connection.execute(
+            text(
+                "INSERT INTO tasks (title, created_at) VALUES"
+                " ('old', '2025-01-01 00:00:00'), ('undated', NULL)"
+            )
+        )
+
+    command.upgrade(config, "head")
+
+    with engine.connect() as connection:
+        rows = connection.execute(
+            text("SELECT title, created_at, updated_at FROM tasks ORDER BY id")
+        ).all()
+    engine.dispose()
+    assert rows[0][2] == rows[0][1]
+    assert rows[1][2] is not None
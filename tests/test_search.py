@@ -0,0 +1,39 @@
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.schema import CreateIndex
+
+from app.models import Task
+from app.search import search_filter, search_rank, search_terms
+
+
+def test_search_terms_strips_tsquery_syntax():
+    assert search_terms("  Fix & bug:* | !urgent ") == ["fix", "bug", "urgent"]
+    assert search_terms("Задача №5") == ["задача", "5"]
+    assert search_terms(None) == []
+
+
+def test_postgres_search_uses_indexed_expression():
+    indexes = {index.name: index for index in Task.__table__.indexes}
+    index = indexes["ix_tasks_search_vector"]
+    index_sql = str(CreateIndex(index).compile(dialect=postgresql.dialect()))
+    assert "USING gin" in index_sql
+
+    query = select(Task).where(search_filter(["fix", "bug"], "postgresql"))
+    query_sql = str(query.compile(dialect=postgresql.dialect()))
+    indexed_expression = index_sql[index_sql.index("(to_tsvector") + 1 : -1]
+    assert indexed_expression.replace("title", "tasks.title").replace(
+        "description", "tasks.description"
+    ) in query_sql
+    assert "@@ to_tsquery" in query_sql
+
+
+def test_search_rank_compiles_for_postgres():
+    sql = str(select(search_rank(["fix"])).compile(dialect=postgresql.dialect()))
+    assert sql.startswith("SELECT ts_rank(to_tsvector(")
+
+
+def test_sqlite_search_falls_back_to_like():
+    query = select(Task).where(search_filter(["fix", "bug"], "sqlite"))
+    sql = str(query.compile(dialect=sqlite.dialect()))
+    assert "to_tsvector" not in sql
+    assert sql.count("LIKE lower(") == 4